@@ -0,0 +1,293 @@
+# batch_classify.py
+
+"""
+Offline batch classification through the provider's batch API.
+
+Every ticket's system + user messages (SYSTEM_PROMPT and the same retrieved context
+the online path uses) are rendered into a JSONL batch file, submitted to the Groq
+batch endpoint, polled until the batch completes, and the results are parsed back into
+TicketClassification. Batches trade latency (up to the completion window) for a lower
+price and no pressure on the online rate limits, which suits nightly backfills.
+
+The LocalBatchBackend runs the same file through the regular chat completions endpoint
+(or any responder function), so the whole flow can be exercised without the batch API.
+
+Usage:
+    python batch_classify.py run [--csv test.csv] [--local]
+    python batch_classify.py submit [--csv test.csv] [--local]
+    python batch_classify.py collect BATCH_ID [--csv test.csv] [--local]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from classifier_engine import OUTPUT_COST_PER_MILLION_TOKENS, get_engine
+from llm_client import get_groq_client
+from message_router import MessageRouter
+from ticket_classifier import (
+    LLM_MODEL,
+    SYSTEM_PROMPT,
+    TicketClassification,
+    calculate_token_cost,
+    calculate_total_input_costs,
+    count_tokens_batch,
+    format_combined_input,
+    retrieve_assembled_contexts,
+)
+
+BATCH_REQUESTS_PATH = os.getenv("BATCH_REQUESTS_PATH", "batch_requests.jsonl")
+BATCH_OUTPUT_CSV = "output_batch.csv"
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+# Batch requests are billed at a fraction of the online price
+BATCH_COST_FACTOR = float(os.getenv("BATCH_COST_FACTOR", "0.5"))
+LOCAL_BATCH_DIR = os.getenv("LOCAL_BATCH_DIR", "batch_local")
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Forced tool call carrying the TicketClassification schema, as instructor sends it online
+CLASSIFICATION_TOOL = {
+    "type": "function",
+    "function": {
+        "name": TicketClassification.__name__,
+        "description": "Correctly extracted `TicketClassification` with all the required parameters with correct types",
+        "parameters": TicketClassification.model_json_schema(),
+    },
+}
+
+
+def custom_id(row_index: int) -> str:
+    return f"row-{row_index}"
+
+
+def render_request(request_id: str, combined_input: str) -> dict:
+    return {
+        "custom_id": request_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": LLM_MODEL,
+            "temperature": 0,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": combined_input},
+            ],
+            "tools": [CLASSIFICATION_TOOL],
+            "tool_choice": {"type": "function", "function": {"name": TicketClassification.__name__}},
+        },
+    }
+
+
+def render_batch(tickets: List[str], path: str = BATCH_REQUESTS_PATH, customer_ids: Optional[List[str]] = None) -> str:
+    """Write one chat completion request per ticket to `path`, with the same context the online path retrieves."""
+    engine = get_engine()
+    assembled = retrieve_assembled_contexts(
+        tickets, engine.interaction_collection, engine.policy_collection, embedding_fn=engine.embedding_fn,
+        customer_names=engine.resolve_customers(tickets, customer_ids),
+    )
+    with open(path, "w", encoding="utf-8") as file:
+        for i, (ticket_text, context) in enumerate(zip(tickets, assembled)):
+            request = render_request(custom_id(i), format_combined_input(ticket_text, context["context"]))
+            file.write(json.dumps(request) + "\n")
+    return path
+
+
+def parse_classification(body: dict) -> TicketClassification:
+    """Extract the TicketClassification from a chat completion response body."""
+    message = body["choices"][0]["message"]
+    if message.get("tool_calls"):
+        return TicketClassification.model_validate_json(message["tool_calls"][0]["function"]["arguments"])
+    # No tool call: fall back to the outermost JSON object in the content (reasoning models may wrap it in prose)
+    match = re.search(r"\{.*\}", message.get("content") or "", re.DOTALL)
+    if match is None:
+        raise ValueError("response contains neither a tool call nor a JSON object")
+    return TicketClassification.model_validate_json(match.group(0))
+
+
+def parse_results(lines: List[str]) -> Dict[str, Union[TicketClassification, str]]:
+    """Map each custom_id to its TicketClassification, or to an error message if the request failed."""
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            results[result["custom_id"]] = json.dumps(result.get("error") or response.get("body"))
+            continue
+        try:
+            results[result["custom_id"]] = parse_classification(response["body"])
+        except (KeyError, IndexError, ValueError) as e:
+            results[result["custom_id"]] = f"unparseable response: {e}"
+    return results
+
+
+# -------------------------------
+# Batch backends
+# -------------------------------
+class GroqBatchBackend:
+    def __init__(self, client=None):
+        self.client = client or get_groq_client()
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as file:
+            uploaded = self.client.files.create(file=file, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> List[str]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        # Successful requests land in the output file, failed ones in the error file
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(self.client.files.content(file_id).read().decode("utf-8").splitlines())
+        return lines
+
+
+class LocalBatchBackend:
+    """Runs a batch file synchronously through `responder` (a request body -> response body function)."""
+
+    def __init__(self, responder: Optional[Callable[[dict], dict]] = None, directory: str = LOCAL_BATCH_DIR):
+        self.responder = responder or self._chat_completion
+        self.directory = directory
+        self._client = None
+
+    def _chat_completion(self, body: dict) -> dict:
+        if self._client is None:
+            self._client = get_groq_client()
+        return self._client.chat.completions.create(**body).model_dump()
+
+    def _output_path(self, batch_id: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.output.jsonl")
+
+    def submit(self, path: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        with open(path, encoding="utf-8") as requests_file, open(self._output_path(batch_id), "w", encoding="utf-8") as output:
+            for line in requests_file:
+                request = json.loads(line)
+                # Same line shape as the batch API output file
+                try:
+                    response = {"status_code": 200, "body": self.responder(request["body"])}
+                    result = {"custom_id": request["custom_id"], "response": response, "error": None}
+                except Exception as e:
+                    result = {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+                output.write(json.dumps(result) + "\n")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed" if os.path.exists(self._output_path(batch_id)) else "failed"
+
+    def results(self, batch_id: str) -> List[str]:
+        with open(self._output_path(batch_id), encoding="utf-8") as file:
+            return file.read().splitlines()
+
+
+def wait_for_batch(backend, batch_id: str, poll_seconds: float = BATCH_POLL_SECONDS) -> str:
+    while True:
+        status = backend.status(batch_id)
+        print(f"{batch_id}: {status}")
+        if status in TERMINAL_STATUSES:
+            return status
+        time.sleep(poll_seconds)
+
+
+def batch_costs(path: str, classifications: Dict[str, TicketClassification]) -> Dict[str, float]:
+    """Discounted input + output cost per successful request, counted the same way as the online path."""
+    request_ids = []
+    combined_inputs = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            request = json.loads(line)
+            if request["custom_id"] in classifications:
+                request_ids.append(request["custom_id"])
+                combined_inputs.append(request["body"]["messages"][1]["content"])
+
+    input_stats = calculate_total_input_costs(combined_inputs)
+    output_tokens = count_tokens_batch(classifications[request_id].model_dump_json(indent=2) for request_id in request_ids)
+    return {
+        request_id: (stats["total_cost"] + calculate_token_cost(tokens, OUTPUT_COST_PER_MILLION_TOKENS)) * BATCH_COST_FACTOR
+        for request_id, stats, tokens in zip(request_ids, input_stats, output_tokens)
+    }
+
+
+def collect(backend, batch_id: str, df: pd.DataFrame, path: str = BATCH_REQUESTS_PATH) -> Tuple[pd.DataFrame, int]:
+    """Attach the batch results to `df` (in the classify_csv output layout); returns the frame and the failure count."""
+    results = parse_results(backend.results(batch_id))
+    classifications = {request_id: result for request_id, result in results.items() if isinstance(result, TicketClassification)}
+    costs = batch_costs(path, classifications)
+
+    rows = [results.get(custom_id(i), "missing from batch output") for i in range(len(df))]
+    succeeded = [i for i, result in enumerate(rows) if isinstance(result, TicketClassification)]
+
+    labels, routing_info = [None] * len(df), [None] * len(df)
+    assigned_team, urgency_level = [None] * len(df), [None] * len(df)
+    # Route all successful rows in one vectorized pass
+    channels = [df["channel"].iloc[i] for i in succeeded] if "channel" in df.columns else None
+    routes = MessageRouter.route_classifications([rows[i] for i in succeeded], channels)
+    for i, routing, team, level in zip(succeeded, MessageRouter.format_routing(routes), routes["assigned_team"], routes["urgency_level"]):
+        labels[i] = rows[i].model_dump_json(indent=2)
+        routing_info[i], assigned_team[i], urgency_level[i] = routing, team, level
+    errors = [None if isinstance(result, TicketClassification) else result for result in rows]
+
+    df = df.copy()
+    df["target_label"] = labels
+    df["routing_info"] = routing_info
+    df["assigned_team"] = assigned_team
+    df["urgency_level"] = urgency_level
+    df["processing_cost"] = [costs.get(custom_id(i), 0.0) for i in range(len(df))]
+    df["batch_error"] = errors
+    return df, sum(error is not None for error in errors)
+
+
+def read_tickets(csv_path: str) -> Tuple[pd.DataFrame, List[str], Optional[List[str]]]:
+    df = pd.read_csv(csv_path, encoding='ISO-8859-1')
+    customer_ids = df["customer_id"].astype(str).tolist() if "customer_id" in df.columns else None
+    return df, df["message_content"].tolist(), customer_ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classify a ticket CSV through the batch API.")
+    parser.add_argument("command", choices=["run", "submit", "collect"])
+    parser.add_argument("batch_id", nargs="?", help="batch to collect")
+    parser.add_argument("--csv", default="test.csv")
+    parser.add_argument("--requests", default=BATCH_REQUESTS_PATH, help="rendered batch file")
+    parser.add_argument("--output", default=BATCH_OUTPUT_CSV)
+    parser.add_argument("--local", action="store_true", help="run the batch locally instead of through the batch API")
+    args = parser.parse_args()
+
+    backend = LocalBatchBackend() if args.local else GroqBatchBackend()
+    df, tickets, customer_ids = read_tickets(args.csv)
+
+    if args.command in ("run", "submit"):
+        render_batch(tickets, args.requests, customer_ids)
+        batch_id = backend.submit(args.requests)
+        print(f"Submitted {len(tickets)} requests as {batch_id}")
+        if args.command == "submit":
+            raise SystemExit(0)
+    else:
+        if not args.batch_id:
+            parser.error("collect needs a BATCH_ID")
+        batch_id = args.batch_id
+
+    status = wait_for_batch(backend, batch_id)
+    if status != "completed":
+        raise SystemExit(f"Batch {batch_id} ended with status {status}")
+
+    df, failures = collect(backend, batch_id, df, args.requests)
+    df.to_csv(args.output, index=False)
+    print(f"Wrote {args.output} ({len(df) - failures} classified, {failures} failed)")
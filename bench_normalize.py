@@ -0,0 +1,97 @@
+# bench_normalize.py
+
+"""
+Text normalization microbenchmark.
+
+Times the Normalizer in text_normalize against the previous per-call implementations
+(kept below as legacy_*), over ticket and policy texts from the bundled CSVs repeated
+to --texts rows, and checks that both produce identical output. The legacy stopword
+path rebuilt the stopword set on every call after an nltk.download; the baseline here
+rebuilds it from the vendored list instead, so the comparison needs no network and
+understates the old cost.
+
+Usage:
+    python bench_normalize.py [--texts 20000] [--runs 5] [--processes 4]
+"""
+
+import argparse
+import csv
+import re
+import statistics
+import string
+import time
+
+from text_normalize import Normalizer, load_stopwords
+
+CSV_ENCODING = "ISO-8859-1"
+
+
+def legacy_normalize_text1(text: str) -> str:
+    text = text.lower()
+    text = text.strip()
+    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text
+
+
+def legacy_normalize_text2(text, remove_stopwords=False):
+    text = text.lower()
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = re.sub(r'\s+', ' ', text).strip()
+    if remove_stopwords:
+        stop_words = set(load_stopwords())
+        words = text.split()
+        text = ' '.join([word for word in words if word not in stop_words])
+    return text
+
+
+def sample_texts(count: int) -> list:
+    texts = []
+    for path, column in (("customer_interactions.csv", 1), ("customer_insurance_policies.csv", 2)):
+        with open(path, encoding=CSV_ENCODING, newline="") as file:
+            reader = csv.reader(file)
+            next(reader)
+            texts.extend(line[column] for line in reader)
+    return (texts * (count // len(texts) + 1))[:count]
+
+
+def median_of(runs: int, func, texts) -> tuple:
+    """Return (median seconds, output of the last run)."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = func(texts)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Normalizer with the previous normalize functions.")
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=4, help="workers for the normalize_many row")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    normalizer = Normalizer()
+    cases = [
+        ("normalize_text1", lambda batch: [legacy_normalize_text1(text) for text in batch],
+         lambda batch: [normalizer.normalize1(text) for text in batch]),
+        ("normalize_text2", lambda batch: [legacy_normalize_text2(text) for text in batch],
+         lambda batch: [normalizer.normalize2(text) for text in batch]),
+        ("normalize_text2 +stopwords", lambda batch: [legacy_normalize_text2(text, True) for text in batch],
+         lambda batch: [normalizer.normalize2(text, True) for text in batch]),
+        (f"normalize_many x{args.processes}", lambda batch: [legacy_normalize_text2(text) for text in batch],
+         lambda batch: normalizer.normalize_many(batch, processes=args.processes)),
+    ]
+
+    print(f"{len(texts)} texts, {sum(map(len, texts)) / 1e6:.1f}M characters, median of {args.runs} runs")
+    print(f"{'case':<28} {'legacy':>10} {'Normalizer':>11} {'speed-up':>9}  same output")
+    for name, legacy, current in cases:
+        legacy_seconds, expected = median_of(args.runs, legacy, texts)
+        current_seconds, actual = median_of(args.runs, current, texts)
+        print(f"{name:<28} {legacy_seconds:>9.3f}s {current_seconds:>10.3f}s {legacy_seconds / current_seconds:>8.1f}x  {actual == expected}")
+
+
+if __name__ == '__main__':
+    main()
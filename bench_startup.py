@@ -0,0 +1,66 @@
+# bench_startup.py
+
+"""
+Startup-time benchmark.
+
+Imports each entry-point module in a fresh interpreter, several times, and reports
+the median import time and whole-process wall time, so regressions in import-time
+work (eager heavy imports, module-level side effects) show up as numbers. With
+--warm-up it also times classifier_engine.warm_up(), i.e. what the first request
+would otherwise pay for.
+
+Usage:
+    python bench_startup.py [--runs 5] [--modules main classify3 server3] [--warm-up]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ["ticket_classifier", "classifier_engine", "main", "classify3", "server3"]
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+WARM_UP_SNIPPET = "import classifier_engine; print(classifier_engine.warm_up())"
+
+
+def time_import(module: str) -> tuple:
+    """Return (import seconds, process wall seconds) for one fresh interpreter."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip()}")
+    return float(result.stdout.strip().splitlines()[-1]), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry-point import / startup times.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--warm-up", action="store_true", help="also time classifier_engine.warm_up()")
+    args = parser.parse_args()
+
+    print(f"{'module':<20} {'import (median)':>16} {'process (median)':>17}")
+    for module in args.modules:
+        try:
+            samples = [time_import(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<20} error: {e}")
+            continue
+        import_seconds = statistics.median(sample[0] for sample in samples)
+        wall_seconds = statistics.median(sample[1] for sample in samples)
+        print(f"{module:<20} {import_seconds:>15.3f}s {wall_seconds:>16.3f}s")
+
+    if args.warm_up:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", WARM_UP_SNIPPET], capture_output=True, text=True)
+        print(f"\nwarm_up: {time.perf_counter() - start:.3f}s total")
+        print(result.stdout.strip() or result.stderr.strip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# classification_cache.py
+
+"""
+Persistent, content-addressed cache of ticket classifications.
+
+Entries are keyed on a hash of the normalized ticket text, the retrieved context,
+the system prompt version and the model name, and hold the TicketClassification
+JSON together with the cost originally paid for it. Entries expire after a TTL
+and the least recently used ones are evicted once the cache grows past its size limit.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from ticket_classifier import TicketClassification
+
+CACHE_PATH = os.getenv("CLASSIFICATION_CACHE_PATH", "classification_cache.sqlite")
+CACHE_TTL_SECONDS = float(os.getenv("CLASSIFICATION_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "100000"))
+
+
+def make_cache_key(normalized_text: str, context: str, prompt_version: str, model: str) -> str:
+    digest = hashlib.sha256()
+    for part in (normalized_text, context, prompt_version, model):
+        digest.update(part.encode("utf-8"))
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ClassificationCache:
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classification_cache (
+                key TEXT PRIMARY KEY,
+                classification TEXT NOT NULL,
+                cost REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON classification_cache (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[TicketClassification, float]]:
+        """Return the cached (classification, original cost) for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT classification, cost, created_at FROM classification_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            classification_json, cost, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM classification_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._size -= 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE classification_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return TicketClassification.model_validate_json(classification_json), cost
+
+    def put(self, key: str, classification: TicketClassification, cost: float):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO classification_cache (key, classification, cost, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, classification.model_dump_json(), cost, now, now),
+            )
+            if cursor.rowcount:
+                self._size += 1
+            else:
+                self._conn.execute(
+                    "UPDATE classification_cache SET classification = ?, cost = ?, created_at = ?, last_access = ? WHERE key = ?",
+                    (classification.model_dump_json(), cost, now, now, key),
+                )
+
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop expired entries first, then the least recently used ones until back under the limit
+        self._conn.execute("DELETE FROM classification_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM classification_cache WHERE key IN ("
+            "SELECT key FROM classification_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self._size,
+            "max_entries": self.max_entries,
+        }
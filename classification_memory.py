@@ -0,0 +1,157 @@
+# classification_memory.py
+
+"""
+Semantic memory of past LLM classifications.
+
+Beyond exact duplicates (handled by the classification cache), many tickets are
+paraphrases of each other. Every ticket the LLM classifies is stored in a Chroma
+collection with its TicketClassification as metadata; a new ticket whose nearest
+stored neighbour is within the configured cosine distance reuses that label instead
+of calling Groq. Matches are restricted to the same customer (tickets with no known
+customer only match each other). The reused label keeps the neighbour's category,
+urgency, sentiment and suggested action, with its confidence scaled down by the
+distance; key_information is cleared, since it holds the other ticket's policy numbers
+and names.
+
+Only LLM results are remembered, never reused ones, so labels can't drift through
+chains of paraphrases. Entries are keyed to the system prompt version and model, expire
+after a TTL, and the least recently used ones are evicted past the size limit.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from ticket_classifier import LLM_MODEL, SYSTEM_PROMPT_VERSION, TicketClassification
+from text_normalize import normalize_text2
+
+MEMORY_COLLECTION = "classification_memory"
+MEMORY_ENABLED = os.getenv("CLASSIFICATION_MEMORY_ENABLED", "0") == "1"
+# Cosine distance (1 - cosine similarity) under which a prior ticket counts as a paraphrase
+MEMORY_MAX_DISTANCE = float(os.getenv("CLASSIFICATION_MEMORY_MAX_DISTANCE", "0.05"))
+MEMORY_TTL_SECONDS = float(os.getenv("CLASSIFICATION_MEMORY_TTL", str(30 * 24 * 3600)))
+MEMORY_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_MEMORY_MAX_ENTRIES", "50000"))
+
+
+def memory_id(ticket_text: str, cust_name: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{cust_name or ''}\0{normalize_text2(ticket_text)}".encode("utf-8")).hexdigest()
+
+
+class ClassificationMemory:
+    def __init__(
+        self,
+        chroma_client,
+        max_distance: float = MEMORY_MAX_DISTANCE,
+        ttl_seconds: float = MEMORY_TTL_SECONDS,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+    ):
+        # Embeddings are always passed in explicitly, so the collection needs no embedding function
+        self.collection = chroma_client.get_or_create_collection(
+            name=MEMORY_COLLECTION, metadata={"hnsw:space": "cosine"}
+        )
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embeddings, customer_names: Optional[Sequence[Optional[str]]] = None) -> List[Optional[Tuple[TicketClassification, str, float]]]:
+        """
+        Return (reused classification, memory id, distance) per embedding, or None where
+        nothing of the same customer (`customer_names`, None when unknown) is close enough.
+        """
+        if len(embeddings) == 0 or self.collection.count() == 0:
+            with self._lock:
+                self.misses += len(embeddings)
+            return [None] * len(embeddings)
+
+        customer_names = customer_names or [None] * len(embeddings)
+        groups = {}
+        for i, cust_name in enumerate(customer_names):
+            groups.setdefault(cust_name or "", []).append(i)
+
+        now = time.time()
+        matches = [None] * len(embeddings)
+        # One query per distinct customer in the batch
+        for cust_name, rows in groups.items():
+            result = self.collection.query(
+                query_embeddings=[embeddings[i] for i in rows],
+                n_results=1,
+                where={"$and": [
+                    {"prompt_version": SYSTEM_PROMPT_VERSION}, {"model": LLM_MODEL}, {"cust_name": cust_name},
+                ]},
+                include=["metadatas", "distances"],
+            )
+            for i, ids, metadatas, distances in zip(rows, result["ids"], result["metadatas"], result["distances"]):
+                if not ids or distances[0] > self.max_distance or now - metadatas[0]["created_at"] > self.ttl_seconds:
+                    continue
+                classification = TicketClassification.model_validate_json(metadatas[0]["classification"])
+                classification.confidence = round(classification.confidence * (1 - distances[0]), 4)
+                # Only the labels carry over; the details belong to the other ticket
+                classification.key_information = []
+                matches[i] = (classification, ids[0], distances[0])
+
+        hit_ids = sorted({match[1] for match in matches if match is not None})
+        if hit_ids:
+            # Recency drives eviction, so hits keep useful entries alive
+            self.collection.update(ids=hit_ids, metadatas=[{"last_used": now}] * len(hit_ids))
+        with self._lock:
+            self.hits += len(matches) - matches.count(None)
+            self.misses += matches.count(None)
+        return matches
+
+    def remember(self, tickets: List[str], embeddings, classifications: List[TicketClassification], customer_names: Optional[Sequence[Optional[str]]] = None):
+        """Store LLM classifications of `tickets` (from `customer_names`) for reuse by later paraphrases."""
+        if not tickets:
+            return
+        now = time.time()
+        customer_names = customer_names or [None] * len(tickets)
+        self.collection.upsert(
+            ids=[memory_id(ticket_text, cust_name) for ticket_text, cust_name in zip(tickets, customer_names)],
+            embeddings=embeddings,
+            documents=[normalize_text2(ticket_text) for ticket_text in tickets],
+            metadatas=[
+                {
+                    "classification": classification.model_dump_json(),
+                    "prompt_version": SYSTEM_PROMPT_VERSION,
+                    "model": LLM_MODEL,
+                    # Chroma metadata can't hold None; "" marks an unknown customer
+                    "cust_name": cust_name or "",
+                    "created_at": now,
+                    "last_used": now,
+                }
+                for classification, cust_name in zip(classifications, customer_names)
+            ],
+        )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until back under the size limit."""
+        with self._lock:
+            expired = self.collection.get(where={"created_at": {"$lt": time.time() - self.ttl_seconds}}, include=[])["ids"]
+            if expired:
+                self.collection.delete(ids=expired)
+                self.evicted += len(expired)
+
+            overflow = self.collection.count() - self.max_entries
+            if overflow > 0:
+                stored = self.collection.get(include=["metadatas"])
+                by_recency = sorted(zip(stored["metadatas"], stored["ids"]), key=lambda entry: entry[0]["last_used"])
+                self.collection.delete(ids=[doc_id for _, doc_id in by_recency[:overflow]])
+                self.evicted += overflow
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted": self.evicted,
+            "size": self.collection.count(),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+        }
@@ -0,0 +1,354 @@
+# classifier_engine.py
+
+"""
+Long-lived classification engine.
+
+Owns the ChromaDB client, the customer interaction / policy collections, the
+sentence-transformer embedding function and the instructor-patched Groq client
+for the life of the process, so a ticket only pays for retrieval and the LLM
+call instead of re-opening the vector store every time.
+
+chromadb and the embedding model are imported / loaded when the engine is first built,
+not when this module is imported; servers call `warm_up` at startup to pay that cost
+before the first request.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from classification_cache import ClassificationCache, make_cache_key
+from classification_memory import MEMORY_ENABLED, ClassificationMemory
+from context_assembler import CONTEXT_SOURCE
+from customer_index import CustomerIndex
+from llm_scheduler import LLM_OUTPUT_TOKEN_ESTIMATE, get_scheduler, priority_score
+from local_classifier import LOCAL_CLASSIFIER_PATH, LocalClassifier
+from text_normalize import get_stopwords, normalize_text2
+from ticket_classifier import (
+    LLM_MODEL,
+    SYSTEM_PROMPT_VERSION,
+    TicketClassification,
+    get_system_prompt,
+    count_tokens_batch,
+    calculate_token_cost,
+    format_combined_input,
+    retrieve_assembled_contexts,
+    classify_ticket_from_input,
+    calculate_total_input_costs,
+    get_llm_client,
+)
+
+VECTOR_DB_PATH = "my_vectordb"
+INTERACTION_COLLECTION = "customer_interaction"
+POLICY_COLLECTION = "customer_policies"
+
+# Output tokens are billed at a different rate than input tokens
+OUTPUT_COST_PER_MILLION_TOKENS = 0.60
+
+# Batch fan-out: how many LLM requests may be in flight at once, and how long a single request may take
+MAX_IN_FLIGHT = int(os.getenv("CLASSIFY_MAX_IN_FLIGHT", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("CLASSIFY_LLM_TIMEOUT", "60"))
+
+CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "1") == "1"
+
+# Two-tier classification: confident local predictions skip the LLM (needs a trained model file)
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "1") == "1"
+
+# Servers load the engine and models at startup rather than on the first request
+WARM_UP_ON_STARTUP = os.getenv("CLASSIFY_WARM_UP", "1") == "1"
+
+
+class ClassifierEngine:
+    def __init__(self, db_path: str = VECTOR_DB_PATH, embedding_fn=None, llm_client=None, cache=None, local_classifier=None, memory=None, scheduler=None):
+        # Heavy imports, deferred until an engine is actually needed
+        import chromadb
+        from embedding_cache import get_embedding_function
+
+        self.chroma_client = chromadb.PersistentClient(path=db_path)
+        # Cached all-mpnet-base-v2 embeddings, shared with every other collection user in the process
+        self.embedding_fn = embedding_fn or get_embedding_function()
+        self.interaction_collection = self._get_collection(INTERACTION_COLLECTION)
+        self.policy_collection = self._get_collection(POLICY_COLLECTION)
+        self.llm_client = llm_client or get_llm_client()
+        # Shared RPM / TPM budgets and 429 backoff for every LLM request in the process
+        self.scheduler = scheduler or get_scheduler()
+        if cache is None and CACHE_ENABLED:
+            cache = ClassificationCache()
+        self.cache = cache
+        if local_classifier is None and LOCAL_CLASSIFIER_ENABLED and os.path.exists(LOCAL_CLASSIFIER_PATH):
+            local_classifier = LocalClassifier.load(LOCAL_CLASSIFIER_PATH)
+        self.local_classifier = local_classifier
+        if memory is None and MEMORY_ENABLED:
+            memory = ClassificationMemory(self.chroma_client)
+        self.memory = memory
+        self.refresh_customer_index()
+
+        # Running totals of context tokens sent per retrieval section
+        self._context_lock = threading.Lock()
+        self.context_tokens = {"tickets": 0, "total_tokens": 0}
+
+    def refresh_customer_index(self):
+        """Rebuild the name -> customer index from the policy metadata (e.g. after re-ingesting policies)."""
+        self.customer_index = CustomerIndex.from_collection(self.policy_collection)
+
+    def resolve_customers(self, tickets: List[str], customer_ids: Optional[List[str]] = None) -> List[Optional[str]]:
+        customer_ids = customer_ids or [None] * len(tickets)
+        return [self.customer_index.resolve(ticket_text, customer_id) for ticket_text, customer_id in zip(tickets, customer_ids)]
+
+    def _get_collection(self, name: str):
+        return self.chroma_client.get_or_create_collection(name=name, embedding_function=self.embedding_fn)
+
+    def reset_interactions(self):
+        """Drop and recreate the customer interaction collection."""
+        self.chroma_client.delete_collection(name=INTERACTION_COLLECTION)
+        self.interaction_collection = self._get_collection(INTERACTION_COLLECTION)
+
+    def clear_classified_interactions(self, page_size: int = 5000) -> int:
+        """
+        Delete the interactions stored by classification runs, keeping the history loaded by
+        ingest.py (source == CONTEXT_SOURCE) that context retrieval draws on. Returns the count.
+        """
+        # Classified rows have no "source" key, which Chroma's $ne doesn't match; filter here
+        doomed, offset = [], 0
+        while True:
+            page = self.interaction_collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            doomed.extend(
+                doc_id for doc_id, metadata in zip(page["ids"], page["metadatas"])
+                if (metadata or {}).get("source") != CONTEXT_SOURCE
+            )
+            offset += len(page["ids"])
+        for start in range(0, len(doomed), page_size):
+            self.interaction_collection.delete(ids=doomed[start:start + page_size])
+        return len(doomed)
+
+    def classify(self, ticket_text: str, timeout: Optional[float] = None, customer_id: Optional[str] = None) -> Tuple[TicketClassification, float]:
+        return self.classify_many([ticket_text], max_in_flight=1, timeout=timeout, customer_ids=[customer_id])[0]
+
+    def _record_context_tokens(self, assembled: List[dict]):
+        with self._context_lock:
+            for context in assembled:
+                self.context_tokens["tickets"] += 1
+                self.context_tokens["total_tokens"] += context["total_tokens"]
+                for section, tokens in context["section_tokens"].items():
+                    self.context_tokens[section] = self.context_tokens.get(section, 0) + tokens
+
+    def _classify_input(self, combined_input: str, timeout: Optional[float] = None, tokens: int = 0, priority: int = 0) -> TicketClassification:
+        return self.scheduler.call(
+            classify_ticket_from_input, tokens, priority, combined_input, client=self.llm_client, timeout=timeout,
+        )
+
+    @staticmethod
+    def _costs(input_stats: List[dict], classifications: List[TicketClassification]) -> List[float]:
+        # Input and output token costs, tokenized as two batches rather than per ticket
+        output_tokens = count_tokens_batch(classification.model_dump_json(indent=2) for classification in classifications)
+        return [
+            stats['total_cost'] + calculate_token_cost(tokens, OUTPUT_COST_PER_MILLION_TOKENS)
+            for stats, tokens in zip(input_stats, output_tokens)
+        ]
+
+    def _cache_outputs(self, keys: list, input_stats: List[dict], outputs: List[TicketClassification]) -> List[float]:
+        """Store LLM answers in the classification cache (when enabled) and return their costs."""
+        if not outputs:
+            return []
+        costs = self._costs(input_stats, outputs)
+        if self.cache is not None:
+            for key, classification, cost in zip(keys, outputs, costs):
+                self.cache.put(key, classification, cost)
+        return costs
+
+    def classify_many(
+        self,
+        tickets: List[str],
+        max_in_flight: Optional[int] = None,
+        timeout: Optional[float] = None,
+        customer_ids: Optional[List[str]] = None,
+    ) -> List[Tuple[TicketClassification, float]]:
+        """
+        Classify a batch of tickets with at most `max_in_flight` LLM requests outstanding.
+
+        Results are returned in the same order as `tickets`. Each request is bounded by
+        `timeout` seconds; the first failing ticket raises, as the sequential loop did.
+        Tickets not sent to the LLM (see `classify_many_detailed`) report a cost of 0.
+        Retrieval is restricted to each ticket's customer when it can be identified from
+        `customer_ids` or the ticket text.
+        """
+        return [
+            (classification, cost)
+            for classification, cost, _ in self.classify_many_detailed(tickets, max_in_flight, timeout, customer_ids)
+        ]
+
+    def classify_many_detailed(
+        self,
+        tickets: List[str],
+        max_in_flight: Optional[int] = None,
+        timeout: Optional[float] = None,
+        customer_ids: Optional[List[str]] = None,
+    ) -> List[Tuple[TicketClassification, float, str]]:
+        """
+        Like `classify_many`, but also returns where each classification was served from:
+        "cache", "duplicate" (of an earlier ticket in the batch), "memory" (a paraphrase
+        in the classification memory), "local" (the first-tier model) or "llm".
+        """
+        max_in_flight = max_in_flight or MAX_IN_FLIGHT
+        timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+
+        # One batched embedding pass, then one query per collection per distinct customer in the batch
+        customer_names = self.resolve_customers(tickets, customer_ids)
+        assembled = retrieve_assembled_contexts(
+            tickets, self.interaction_collection, self.policy_collection, embedding_fn=self.embedding_fn,
+            customer_names=customer_names,
+        )
+        self._record_context_tokens(assembled)
+        contexts = [context["context"] for context in assembled]
+
+        results = [None] * len(tickets)
+        # Tickets that need the LLM, grouped so identical inputs in one batch are only sent once
+        pending = {}
+        for i, (ticket_text, context) in enumerate(zip(tickets, contexts)):
+            if self.cache is None:
+                pending[i] = [i]
+                continue
+            key = make_cache_key(normalize_text2(ticket_text), context, SYSTEM_PROMPT_VERSION, LLM_MODEL)
+            if key in pending:
+                pending[key].append(i)
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = (cached[0], 0.0, "cache")
+            else:
+                pending[key] = [i]
+
+        # Already embedded for retrieval, so this is an embedding cache hit
+        embeddings = {}
+        if pending and (self.memory is not None or self.local_classifier is not None):
+            keys = list(pending)
+            embeddings = dict(zip(keys, self.embedding_fn([tickets[pending[key][0]] for key in keys])))
+
+        # Paraphrases of tickets the LLM has already classified reuse that label
+        if self.memory is not None and pending:
+            keys = list(pending)
+            matches = self.memory.lookup(
+                [embeddings[key] for key in keys], [customer_names[pending[key][0]] for key in keys],
+            )
+            for key, match in zip(keys, matches):
+                if match is not None:
+                    for row in pending.pop(key):
+                        results[row] = (match[0], 0.0, "memory")
+
+        # First tier: the local model answers confident tickets, the rest are escalated to the LLM
+        predictions = {}
+        if self.local_classifier is not None and pending:
+            keys = list(pending)
+            for key, prediction in zip(keys, self.local_classifier.predict([embeddings[key] for key in keys])):
+                classification = None
+                if self.local_classifier.confident(prediction):
+                    classification = self.local_classifier.to_classification(prediction)
+                if classification is None:
+                    predictions[key] = prediction
+                    continue
+                for row in pending.pop(key):
+                    results[row] = (classification, 0.0, "local")
+                self.local_classifier.record_local()
+
+        combined_inputs = [format_combined_input(tickets[rows[0]], contexts[rows[0]]) for rows in pending.values()]
+        # Token counts are needed up front for the scheduler's TPM budget, and again for the costs
+        input_stats = calculate_total_input_costs(combined_inputs)
+        requests = [
+            (combined_input, timeout, stats["total_tokens"] + LLM_OUTPUT_TOKEN_ESTIMATE, priority_score(tickets[rows[0]]))
+            for combined_input, stats, rows in zip(combined_inputs, input_stats, pending.values())
+        ]
+        # Most urgent first (FIFO within a priority). Only max_in_flight requests wait in the
+        # scheduler at a time, so its priority queue alone would only reorder within that window
+        order = sorted(range(len(requests)), key=lambda i: -requests[i][3])
+        outputs = [None] * len(requests)
+        keys = list(pending)
+
+        def cache_completed():
+            # Keep the answers already paid for, so a retry of the batch hits the cache
+            done = [i for i in order if outputs[i] is not None]
+            self._cache_outputs([keys[i] for i in done], [input_stats[i] for i in done], [outputs[i] for i in done])
+
+        if max_in_flight <= 1 or len(requests) <= 1:
+            try:
+                for i in order:
+                    outputs[i] = self._classify_input(*requests[i])
+            except Exception:
+                cache_completed()
+                raise
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_in_flight, len(requests))) as executor:
+                futures = {i: executor.submit(self._classify_input, *requests[i]) for i in order}
+                try:
+                    for i, future in futures.items():
+                        outputs[i] = future.result()
+                except Exception:
+                    # The batch fails anyway: don't send (and pay for) the requests still queued
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    for i, future in futures.items():
+                        if not future.cancelled() and future.exception() is None:
+                            outputs[i] = future.result()
+                    cache_completed()
+                    raise
+
+        costs = self._cache_outputs(keys, input_stats, outputs)
+        for (key, rows), classification, cost in zip(pending.items(), outputs, costs):
+            if key in predictions:
+                self.local_classifier.record_escalation(predictions[key], classification, cost)
+            results[rows[0]] = (classification, cost, "llm")
+            for row in rows[1:]:
+                results[row] = (classification, 0.0, "duplicate")
+
+        if self.memory is not None and pending:
+            self.memory.remember(
+                [tickets[rows[0]] for rows in pending.values()],
+                [embeddings[key] for key in pending],
+                outputs,
+                [customer_names[rows[0]] for rows in pending.values()],
+            )
+
+        return results
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ClassifierEngine:
+    """Return the process-wide engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ClassifierEngine()
+    return _engine
+
+
+def warm_up() -> dict:
+    """
+    Build the engine and load everything the first request would otherwise wait for:
+    the embedding model, the tokenizer (with the system prompt count), the LLM client and
+    the stopword list (so a missing list fails at startup rather than mid-batch).
+    Returns the seconds spent per step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    engine = get_engine()
+    timings["engine"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if hasattr(engine.embedding_fn, "load_model"):
+        engine.embedding_fn.load_model()
+    timings["embedding_model"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    calculate_total_input_costs([get_system_prompt()])
+    timings["tokenizer"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_stopwords()
+    timings["stopwords"] = time.perf_counter() - start
+    return timings
@@ -1,19 +1,17 @@
-from intent_prediction2 import classify_ticket
+from classifier_engine import get_engine
 import pandas as pd
 from message_router import MessageRouter
 
 def classify(logs):
-    labels = []
-    label2 = []
-    for source, log_msg in logs:
-        label = classify_log(source, log_msg)
-        labels.append(label)
-        router = MessageRouter(label)
-        label2.append(router.display_routing())
+    results = get_engine().classify_many([log_msg for _, log_msg in logs])
+    classifications = [classification for classification, _ in results]
+    labels = [classification.model_dump_json(indent=2) for classification in classifications]
+    # Route the whole batch from the typed objects rather than re-parsing each label
+    label2 = MessageRouter.format_routing(MessageRouter.route_classifications(classifications)).tolist()
     return labels,label2
 
 def classify_log(source, log_msg):
-    label = classify_ticket(log_msg)
+    label, _ = get_engine().classify(log_msg)
     return label.model_dump_json(indent=2)
 
 def classify_csv(input_file):
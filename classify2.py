@@ -1,23 +1,18 @@
-from intent_prediction2 import classify_ticket
-from main import classify_and_get_cost
+from classifier_engine import get_engine
 import pandas as pd
 from message_router import MessageRouter
 
 def classify(logs):
-    labels = []
-    processing_cost = []
-    label2 = []
-
-    for source, log_msg in logs:
-        label,cost = classify_log(source, log_msg)
-        labels.append(label)
-        processing_cost.append(cost)
-        router = MessageRouter(label)
-        label2.append(router.display_routing())
+    results = get_engine().classify_many([log_msg for _, log_msg in logs])
+    classifications = [classification for classification, _ in results]
+    processing_cost = [cost for _, cost in results]
+    labels = [classification.model_dump_json(indent=2) for classification in classifications]
+    # Route the whole batch from the typed objects rather than re-parsing each label
+    label2 = MessageRouter.format_routing(MessageRouter.route_classifications(classifications)).tolist()
     return labels,label2,processing_cost
 
 def classify_log(source, log_msg):
-    classification, total_cost = classify_and_get_cost(log_msg)
+    classification, total_cost = get_engine().classify(log_msg)
     label = classification.model_dump_json(indent=2)
     return label,total_cost
 
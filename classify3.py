@@ -1,60 +1,95 @@
 # from intent_prediction2 import classify_ticket
-from main import classify_and_get_cost
+from classifier_engine import get_engine
 from message_router import MessageRouter
+from team_queues import TEAM_QUEUES_ENABLED, get_team_queues
 from text_normalize import normalize_text2
 
 import pandas as pd
-import chromadb
-from chromadb.utils import embedding_functions
 import uuid
 
-# Setup ChromaDB persistent client
-chroma_client = chromadb.PersistentClient(path="my_vectordb")
-
-# Define the embedding function
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-mpnet-base-v2")
-
-# Uncomment to reset collection
-chroma_client.delete_collection(name="customer_interaction")
-
-# Get or create the collection
-collection = chroma_client.get_or_create_collection(name="customer_interaction", embedding_function=embedding_fn)
-
-def classify(logs):
-    labels = []
-    processing_costs = []
-    routing_info = []
-    log_ids = []
-
-    documents = []
+# The shared engine (ChromaDB client, collections, LLM client) is built on first use, not at import.
+# To drop earlier classification results but keep the ingested history, call
+# get_engine().clear_classified_interactions() first; reset_interactions() drops everything.
+
+def classify_frame(logs, max_in_flight=None, timeout=None, customer_ids=None):
+    """
+    Classify, route and store a batch of (channel, message_content) logs.
+
+    Returns a DataFrame in row order with target_label, routing_info, assigned_team,
+    urgency_level, processing_cost, chroma_vector_id and served_from columns. With team
+    queues enabled (TEAM_QUEUES_ENABLED=1) there is also a queued_team column: the team
+    whose queue took the ticket, which differs from assigned_team when that team was
+    full and overflowed, and is None when every team in the overflow chain was full.
+    """
+    engine = get_engine()
+    messages = [message_content for _, message_content in logs]
+    # Customer per ticket, so stored interactions can be retrieved with a customer filter later
+    customer_names = engine.resolve_customers(messages, customer_ids)
+
+    # LLM calls fan out concurrently; results come back in row order
+    results = engine.classify_many_detailed(
+        messages,
+        max_in_flight=max_in_flight,
+        timeout=timeout,
+        customer_ids=customer_ids,
+    )
+    # Classification, cost and where it came from (cache, memory, local model or LLM)
+    classifications = [classification for classification, _, _ in results]
+    sources = [source for _, _, source in results]
+
+    # Prepare for Chroma
+    ids = [str(uuid.uuid4()) for _ in logs]
+    documents = [normalize_text2(message_content) for message_content in messages]
     metadatas = []
-    ids = []
-
-    for i, (channel, message_content) in enumerate(logs):
-        # Normalize and prepare for Chroma
-        norm_msg = normalize_text2(message_content)
-        doc_id = str(uuid.uuid4())
-        documents.append(norm_msg)
-        metadatas.append({"channel": channel})
-        ids.append(doc_id)
-        log_ids.append(doc_id)
-
-        # Classify and compute cost
-        label, cost = classify_log(channel, message_content)
-        labels.append(label)
-        processing_costs.append(cost)
-
-        # Routing
-        router = MessageRouter(label)
-        routing_info.append(router.display_routing())
-
-    # Add to ChromaDB
-    collection.add(documents=documents, metadatas=metadatas, ids=ids)
-
-    return labels, routing_info, processing_costs, log_ids
+    for (channel, _), source, cust_name in zip(logs, sources, customer_names):
+        metadata = {"channel": channel, "served_from": source}
+        if cust_name:
+            metadata["cust_name"] = cust_name
+        metadatas.append(metadata)
+
+    # Route the whole batch from the typed classifications, no per-row JSON round-trip
+    frame = MessageRouter.route_classifications(classifications, channels=[channel for channel, _ in logs])
+    if TEAM_QUEUES_ENABLED:
+        # Queue every ticket with its team, overflowing to the configured backup team when it is full
+        frame["queued_team"] = get_team_queues().enqueue_many([
+            {
+                "ticket_id": ticket_id,
+                "assigned_team": team,
+                "urgency": getattr(classification.urgency, "value", classification.urgency),
+                "sentiment": getattr(classification.sentiment, "value", classification.sentiment),
+            }
+            for ticket_id, team, classification in zip(ids, frame["assigned_team"], classifications)
+        ])
+    frame.insert(0, "target_label", [classification.model_dump_json(indent=2) for classification in classifications])
+    frame.insert(1, "routing_info", MessageRouter.format_routing(frame))
+    frame["processing_cost"] = [cost for _, cost, _ in results]
+    frame["chroma_vector_id"] = ids
+    frame["served_from"] = sources
+
+    # Add to ChromaDB, reusing the ticket embeddings already computed (and cached) for retrieval
+    embeddings = engine.embedding_fn(messages)
+    engine.interaction_collection.add(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+
+    return frame
+
+def classify(logs, max_in_flight=None, timeout=None, customer_ids=None):
+    frame = classify_frame(logs, max_in_flight=max_in_flight, timeout=timeout, customer_ids=customer_ids)
+    return (
+        frame["target_label"].tolist(),
+        frame["routing_info"].tolist(),
+        frame["processing_cost"].tolist(),
+        frame["chroma_vector_id"].tolist(),
+    )
+
+def served_from(chroma_ids):
+    """Audit where the classification of each stored row (by chroma_vector_id) was served from."""
+    engine = get_engine()
+    stored = engine.interaction_collection.get(ids=list(chroma_ids), include=["metadatas"])
+    sources = {doc_id: (metadata or {}).get("served_from") for doc_id, metadata in zip(stored["ids"], stored["metadatas"])}
+    return [sources.get(doc_id) for doc_id in chroma_ids]
 
 def classify_log(channel, message_content):
-    classification, total_cost = classify_and_get_cost(message_content)
+    classification, total_cost = get_engine().classify(message_content)
     label = classification.model_dump_json(indent=2)
     return label, total_cost
 
@@ -63,15 +98,28 @@ def classify_csv(input_file):
 
     # Classify based on 'channel' and 'message_content'
     logs = list(zip(df["channel"], df["message_content"]))
-    labels, routing_info, processing_costs, chroma_ids = classify(logs)
+    # An explicit customer_id column takes precedence over names found in the ticket text
+    customer_ids = df["customer_id"].astype(str).tolist() if "customer_id" in df.columns else None
+    results = classify_frame(logs, customer_ids=customer_ids)
 
     # Append results
-    df["target_label"] = labels
-    df["routing_info"] = routing_info
-    df["processing_cost"] = processing_costs
-    df["chroma_vector_id"] = chroma_ids
+    for column in results.columns:
+        df[column] = results[column].to_numpy()
 
     print(df.head())
+    engine = get_engine()
+    if engine.cache is not None:
+        print("Classification cache:", engine.cache.stats())
+    print("Context tokens:", engine.context_tokens)
+    if engine.local_classifier is not None:
+        print("Local classifier:", engine.local_classifier.stats())
+    if engine.memory is not None:
+        print("Classification memory:", engine.memory.stats())
+    print("LLM scheduler:", engine.scheduler.stats())
+    if TEAM_QUEUES_ENABLED:
+        queues = get_team_queues()
+        queues.save()
+        print("Team queues:", queues.states())
 
     output_file = "output_with_chroma.csv"
     df.to_csv(output_file, index=False)
@@ -79,4 +127,6 @@ def classify_csv(input_file):
     return output_file
 
 if __name__ == '__main__':
+    # One-shot runs start without earlier classification results; the ingested history stays for retrieval
+    get_engine().clear_classified_interactions()
     classify_csv("test.csv")
@@ -0,0 +1,27 @@
+# classify_executor.py
+
+"""
+Shared worker pool for running blocking classification work from async FastAPI handlers.
+
+Groq HTTP calls, ChromaDB queries and sentence-transformer inference are all synchronous;
+running them on this pool keeps the event loop free for other requests and health checks.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=CLASSIFY_WORKERS, thread_name_prefix="classify")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the classification pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
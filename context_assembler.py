@@ -0,0 +1,71 @@
+# context_assembler.py
+
+"""
+Token-budgeted assembly of the retrieved context sent to the LLM.
+
+Retrieved passages from every section (customer interactions, policies) are ranked
+together by distance, exact duplicates are dropped, and passages are added until the
+token budget is spent; the passage that crosses the budget is truncated to fit.
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+from text_normalize import normalize_text1
+from token_accounting import count_tokens_batch, get_encoding
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "512"))
+# Passages retrieved per section before ranking; more candidates give the budget more to choose from
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "3"))
+# A truncated passage shorter than this is dropped rather than sent as a fragment
+MIN_PASSAGE_TOKENS = 16
+# Only interactions loaded by ingest.py are retrieved as context. Classified tickets stored back
+# into the collection would otherwise be a resubmitted ticket's nearest neighbour, changing its
+# context (and so its classification cache key) on every retry
+CONTEXT_SOURCE = "ingest"
+
+
+def assemble_context(sections: Dict[str, List[Tuple[str, float]]], token_budget: int = CONTEXT_TOKEN_BUDGET) -> dict:
+    """
+    Build the additional context from `sections`, a mapping of section name to (passage, distance) pairs.
+
+    Returns the context text, the tokens used per section and in total. Sections keep their
+    order in the output, and passages within a section are ordered by distance.
+    """
+    candidates = [
+        (distance, section, passage)
+        for section, passages in sections.items()
+        for passage, distance in passages
+        if passage
+    ]
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    seen = set()
+    unique = []
+    for distance, section, passage in candidates:
+        key = normalize_text1(passage)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append((distance, section, passage))
+
+    selected = {section: [] for section in sections}
+    section_tokens = {section: 0 for section in sections}
+    remaining = token_budget
+    for (distance, section, passage), tokens in zip(unique, count_tokens_batch(passage for _, _, passage in unique)):
+        if remaining < MIN_PASSAGE_TOKENS:
+            break
+        if tokens > remaining:
+            encoding = get_encoding()
+            passage = encoding.decode(encoding.encode(passage)[:remaining]).strip()
+            tokens = remaining
+        selected[section].append(passage)
+        section_tokens[section] += tokens
+        remaining -= tokens
+
+    context = " ".join(" ".join(passages) for passages in selected.values() if passages)
+    return {
+        "context": context,
+        "section_tokens": section_tokens,
+        "total_tokens": token_budget - remaining,
+    }
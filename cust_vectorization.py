@@ -1,54 +1,7 @@
-import csv
-from text_normalize import normalize_text1, normalize_text2
-import chromadb
-from chromadb.utils import embedding_functions
+from ingest import ingest_policies
 
-# Load data from the CSV file
-with open('customer_insurance_policies.csv') as file:
-    reader = csv.reader(file)
-
-    # Skip header
-    next(reader)
-
-    documents = []
-    metadatas = []
-    ids = []
-
-    id = 1
-    for line in reader:
-        customer_id = line[0]
-        cust_name = normalize_text1(line[1])
-        policy_text = normalize_text2(line[2])
-
-        # You can combine customer name and policy text as the document if desired
-        doc = f"{cust_name}. {policy_text}"
-
-        documents.append(doc)
-        metadatas.append({"customer_id": customer_id, "cust_name": cust_name})
-        ids.append(str(id))
-        id += 1
-
-# Set up ChromaDB with persistent storage
-chroma_client = chromadb.PersistentClient(path="my_vectordb")
-
-# Optional: Delete the existing collection if needed
-chroma_client.delete_collection(name="customer_policies")
-
-# Initialize embedding function
-sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-mpnet-base-v2")
-
-# Create or get the vector collection
-collection = chroma_client.get_or_create_collection(
-    name="customer_policies",
-    embedding_function=sentence_transformer_ef
-)
-
-# Add documents to the collection
-collection.add(
-    documents=documents,
-    metadatas=metadatas,
-    ids=ids
-)
+# Sync the CSV into the collection: only new or changed policies are embedded, removed ones are deleted
+collection = ingest_policies('customer_insurance_policies.csv')
 
 # Query the collection
 results = collection.query(
@@ -0,0 +1,74 @@
+# customer_index.py
+
+"""
+In-memory index from customer names / ids to the canonical `cust_name` stored as
+policy metadata, used to restrict retrieval to the ticket's own customer.
+
+Tickets usually open with the customer's name ("Charlie Davis : ...") or introduce
+them ("my name is George Anderson"); policies are stored under a shorter name
+("charlie"), so lookups try the full name first and then the first name.
+"""
+
+import csv
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from text_normalize import normalize_text1
+
+# "Charlie Davis : ..." / "John Doe: ..." at the very start of the ticket
+NAME_PREFIX = re.compile(r"^\s*([A-Za-z][A-Za-z .'-]{0,60}?)\s*:")
+# "Hi, my name is George Anderson, ..." / "Hi, this is Bob Johnson, ..."
+NAME_INTRO = re.compile(r"\b(?:my name is|this is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)")
+
+
+class CustomerIndex:
+    def __init__(self, customers: Iterable[Tuple[str, str]]):
+        """`customers` is an iterable of (customer_id, cust_name) pairs as stored in the policy metadata."""
+        self.by_id: Dict[str, str] = {}
+        self.by_name: Dict[str, str] = {}
+        first_names: Dict[str, set] = {}
+
+        for customer_id, cust_name in customers:
+            cust_name = normalize_text1(cust_name)
+            self.by_id[str(customer_id)] = cust_name
+            self.by_name[cust_name] = cust_name
+            first_names.setdefault(cust_name.split(" ")[0], set()).add(cust_name)
+
+        # A first name only identifies a customer if no two customers share it
+        self.by_first_name = {first: names.pop() for first, names in first_names.items() if len(names) == 1}
+
+    @classmethod
+    def from_collection(cls, policy_collection) -> "CustomerIndex":
+        metadatas = policy_collection.get(include=["metadatas"])["metadatas"]
+        return cls(
+            (metadata["customer_id"], metadata["cust_name"])
+            for metadata in metadatas
+            if metadata and "customer_id" in metadata and "cust_name" in metadata
+        )
+
+    @classmethod
+    def from_policies_csv(cls, path: str, encoding: str = "ISO-8859-1") -> "CustomerIndex":
+        with open(path, encoding=encoding, newline="") as file:
+            reader = csv.reader(file)
+            # Skip header
+            next(reader)
+            return cls((line[0], line[1]) for line in reader)
+
+    def lookup_name(self, name: str) -> Optional[str]:
+        name = normalize_text1(name)
+        if name in self.by_name:
+            return self.by_name[name]
+        return self.by_first_name.get(name.split(" ")[0]) if name else None
+
+    def resolve(self, ticket_text: str, customer_id: Optional[str] = None) -> Optional[str]:
+        """Return the canonical cust_name for a ticket, or None if the customer can't be identified."""
+        if customer_id is not None and str(customer_id) in self.by_id:
+            return self.by_id[str(customer_id)]
+
+        for pattern in (NAME_PREFIX, NAME_INTRO):
+            match = pattern.search(ticket_text)
+            if match:
+                cust_name = self.lookup_name(match.group(1))
+                if cust_name:
+                    return cust_name
+        return None
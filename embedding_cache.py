@@ -0,0 +1,211 @@
+# embedding_cache.py
+
+"""
+Caching wrapper around the sentence-transformer embedding function.
+
+Vectors are memoized by a hash of the input text, first in an in-memory LRU and
+optionally in an on-disk store (a memory-mapped float32 matrix plus a SQLite
+index), so a given ticket is only run through the model once per pipeline run
+and across restarts. The sentence-transformer model is only loaded on the first cache
+miss, so a process whose tickets are all cached never loads it.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+EMBEDDING_MODEL = "all-mpnet-base-v2"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_MAX_MEMORY = int(os.getenv("EMBEDDING_CACHE_MAX_MEMORY", "50000"))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DiskVectorStore:
+    """
+    Append-only float32 vector file, read through np.memmap, with a SQLite key -> row index.
+
+    Several processes (server workers, ingest, the CLI) may share one directory: appends
+    happen inside a SQLite write transaction, which serializes writers across processes,
+    and the row count is re-read from the index under it rather than trusted from memory.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.Lock()
+        # Autocommit mode, so writes can take the database lock explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), timeout=30, isolation_level=None, check_same_thread=False,
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vector_index (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.dim = self._read_dim()
+        self._mmap = None
+
+    def _read_dim(self) -> Optional[int]:
+        dim = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return dim[0] if dim else None
+
+    def _matrix(self, rows: int):
+        """A read-only view of at least `rows` rows; remapped when another writer has grown the file."""
+        if self._mmap is None or self._mmap.shape[0] < rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        with self._lock:
+            if self.dim is None:
+                # Another process may have stored the first vectors since we opened the store
+                self.dim = self._read_dim()
+                if self.dim is None:
+                    return {}
+            found = {}
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, row FROM vector_index WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            if not found:
+                return {}
+            # Indexed rows are always fully written: the index is committed after the vectors
+            matrix = self._matrix(max(found.values()) + 1)
+            return {key: np.array(matrix[row]) for key, row in found.items()}
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._lock:
+            # Holds the database write lock until COMMIT, so no other process appends meanwhile
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(items)
+                stored = set()
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    stored.update(key for key, in self._conn.execute(
+                        f"SELECT key FROM vector_index WHERE key IN ({placeholders})", chunk
+                    ))
+                # Another process may have embedded the same texts meanwhile
+                keys = [key for key in keys if key not in stored]
+                if not keys:
+                    self._conn.execute("COMMIT")
+                    return
+                vectors = np.asarray([items[key] for key in keys], dtype=np.float32)
+                self.dim = self._read_dim()
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self._conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+
+                # Rows referenced by the index; anything past this in the file is a torn write
+                rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vector_index").fetchone()[0]
+                with open(self.vectors_path, "ab") as f:
+                    # Drop any torn tail left by an interrupted write so row numbers stay aligned
+                    f.truncate(rows * self.dim * 4)
+                    f.write(vectors.tobytes())
+
+                self._conn.executemany(
+                    "INSERT INTO vector_index (key, row) VALUES (?, ?)",
+                    [(key, rows + i) for i, key in enumerate(keys)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class CachingEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, model_name: str = EMBEDDING_MODEL, max_memory_entries: int = EMBEDDING_CACHE_MAX_MEMORY, cache_dir: Optional[str] = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self._embedding_fn = None
+        self.max_memory_entries = max_memory_entries
+        # Keep model vectors apart in case the model is ever changed
+        self._disk = DiskVectorStore(os.path.join(cache_dir, model_name)) if cache_dir else None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [text_hash(text) for text in input]
+        vectors = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and self._disk is not None:
+            from_disk = self._disk.get_many(missing)
+            vectors.update(from_disk)
+            self._remember(from_disk)
+            missing = [key for key in missing if key not in from_disk]
+
+        if missing:
+            # Embed each distinct uncached text once, in a single batched model call
+            missing_keys = set(missing)
+            texts = {}
+            for key, text in zip(keys, input):
+                if key in missing_keys:
+                    texts.setdefault(key, text)
+            embedded = dict(zip(texts, self.load_model()(list(texts.values()))))
+            vectors.update(embedded)
+            self._remember(embedded)
+            if self._disk is not None:
+                self._disk.put_many(embedded)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        return [vectors[key] for key in keys]
+
+    def load_model(self):
+        """Load the sentence-transformer model if it isn't loaded yet (e.g. to warm up a server)."""
+        if self._embedding_fn is None:
+            with self._lock:
+                if self._embedding_fn is None:
+                    from chromadb.utils import embedding_functions
+
+                    self._embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        return self._embedding_fn
+
+    def _remember(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in items.items():
+                self._memory[key] = vector
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+_embedding_fn = None
+_embedding_fn_lock = threading.Lock()
+
+
+def get_embedding_function() -> CachingEmbeddingFunction:
+    """Return the process-wide caching embedding function, loading the model on first use."""
+    global _embedding_fn
+    if _embedding_fn is None:
+        with _embedding_fn_lock:
+            if _embedding_fn is None:
+                _embedding_fn = CachingEmbeddingFunction()
+    return _embedding_fn
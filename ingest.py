@@ -0,0 +1,182 @@
+# ingest.py
+
+"""
+Incremental, idempotent ingestion of the customer CSVs into ChromaDB.
+
+Every row gets a stable id built from its customer_id and a hash of its content.
+A run compares those ids with the ones already in the collection, embeds and adds
+only new or changed rows, and deletes rows that disappeared from the CSV, so
+re-running on an unchanged file does no embedding work at all.
+
+Policy documents are long, so each one is split into token-bounded, overlapping
+chunks; retrieval then returns the relevant passage instead of the whole policy.
+Writes go to Chroma in fixed-size batches to keep peak memory bounded.
+
+Usage:
+    python ingest.py policies [--csv customer_insurance_policies.csv] [--dry-run]
+    python ingest.py interactions [--csv customer_interactions.csv] [--dry-run]
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import chromadb
+
+from context_assembler import CONTEXT_SOURCE
+from customer_index import CustomerIndex
+from embedding_cache import get_embedding_function
+from text_normalize import normalize_text1, normalize_text2
+from token_accounting import get_encoding
+
+VECTOR_DB_PATH = "my_vectordb"
+POLICY_COLLECTION = "customer_policies"
+INTERACTION_COLLECTION = "customer_interaction"
+POLICIES_CSV = "customer_insurance_policies.csv"
+INTERACTIONS_CSV = "customer_interactions.csv"
+
+# The source CSVs are exported from Excel on Windows
+CSV_ENCODING = "ISO-8859-1"
+
+# Policy chunking and write batching
+CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("INGEST_CHUNK_OVERLAP_TOKENS", "40"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+
+# Marks ids owned by this loader, so rows added elsewhere (e.g. classified tickets) are never
+# deleted, and only these rows are retrieved as classification context
+INGEST_SOURCE = CONTEXT_SOURCE
+
+
+def content_id(customer_id: str, document: str, metadata: dict) -> str:
+    digest = hashlib.sha256(document.encode("utf-8"))
+    for key in sorted(metadata):
+        digest.update(f"\0{key}={metadata[key]}".encode("utf-8"))
+    return f"{customer_id}-{digest.hexdigest()[:16]}"
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split `text` into windows of at most `chunk_tokens` tokens, each sharing `overlap_tokens` with the previous one."""
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+    encoding = get_encoding()
+    tokens = encoding.encode(text)
+    if len(tokens) <= chunk_tokens:
+        return [text]
+
+    chunks = []
+    step = chunk_tokens - overlap_tokens
+    for start in range(0, len(tokens), step):
+        chunks.append(encoding.decode(tokens[start:start + chunk_tokens]).strip())
+        if start + chunk_tokens >= len(tokens):
+            break
+    return chunks
+
+
+def read_policies(path: str = POLICIES_CSV, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> Iterator[Tuple[str, str, dict]]:
+    """Yield (id, document, metadata) for every chunk of every policy."""
+    with open(path, encoding=CSV_ENCODING, newline="") as file:
+        reader = csv.reader(file)
+        # Skip header
+        next(reader)
+        for line in reader:
+            customer_id = line[0]
+            cust_name = normalize_text1(line[1])
+            policy_text = normalize_text2(line[2])
+
+            # Chunk settings are part of the row id so changing them re-chunks every policy
+            row_id = content_id(customer_id, policy_text, {
+                "cust_name": cust_name, "chunk_tokens": chunk_tokens, "overlap_tokens": overlap_tokens,
+            })
+            chunks = chunk_text(policy_text, chunk_tokens, overlap_tokens)
+            for chunk_index, chunk in enumerate(chunks):
+                metadata = {
+                    "customer_id": customer_id,
+                    "cust_name": cust_name,
+                    "chunk_index": chunk_index,
+                    "chunk_count": len(chunks),
+                }
+                yield f"{row_id}-{chunk_index}", f"{cust_name}. {chunk}", metadata
+
+
+def read_interactions(path: str = INTERACTIONS_CSV, policies_path: str = POLICIES_CSV) -> Iterator[Tuple[str, str, dict]]:
+    """Yield (id, document, metadata) for every interaction."""
+    # Tag interactions with the policy holder's cust_name so retrieval can filter on it
+    customer_index = CustomerIndex.from_policies_csv(policies_path, CSV_ENCODING)
+    with open(path, encoding=CSV_ENCODING, newline="") as file:
+        reader = csv.reader(file)
+        # Skip header
+        next(reader)
+        for line in reader:
+            metadata = {"customer_id": line[0]}
+            cust_name = customer_index.resolve(line[1])
+            if cust_name:
+                metadata["cust_name"] = cust_name
+            yield content_id(line[0], line[1], metadata), line[1], metadata
+
+
+def sync_collection(collection, entries, dry_run: bool = False, batch_size: int = INGEST_BATCH_SIZE) -> Dict[str, int]:
+    """Bring `collection` in line with the (id, document, metadata) `entries`, touching only what changed."""
+    desired = {}
+    for doc_id, document, metadata in entries:
+        desired[doc_id] = (document, {**metadata, "source": INGEST_SOURCE})
+
+    stored = collection.get(include=["metadatas"])
+    existing = {
+        doc_id
+        for doc_id, metadata in zip(stored["ids"], stored["metadatas"])
+        # Plain numeric ids were written by the original delete-and-reload scripts
+        if (metadata or {}).get("source") == INGEST_SOURCE or doc_id.isdigit()
+    }
+    to_add = [doc_id for doc_id in desired if doc_id not in existing]
+    to_delete = sorted(existing - desired.keys())
+
+    if not dry_run:
+        if to_delete:
+            collection.delete(ids=to_delete)
+        # Each upsert embeds and writes one bounded batch
+        for start in range(0, len(to_add), batch_size):
+            batch = to_add[start:start + batch_size]
+            collection.upsert(
+                ids=batch,
+                documents=[desired[doc_id][0] for doc_id in batch],
+                metadatas=[desired[doc_id][1] for doc_id in batch],
+            )
+            print(f"  embedded {min(start + batch_size, len(to_add))}/{len(to_add)}")
+
+    return {"added": len(to_add), "deleted": len(to_delete), "unchanged": len(desired) - len(to_add)}
+
+
+def get_collection(name: str, db_path: str = VECTOR_DB_PATH):
+    chroma_client = chromadb.PersistentClient(path=db_path)
+    return chroma_client.get_or_create_collection(name=name, embedding_function=get_embedding_function())
+
+
+def ingest_policies(path: str = POLICIES_CSV, dry_run: bool = False, batch_size: int = INGEST_BATCH_SIZE):
+    collection = get_collection(POLICY_COLLECTION)
+    summary = sync_collection(collection, read_policies(path), dry_run, batch_size)
+    print(f"{POLICY_COLLECTION}: {summary}")
+    return collection
+
+
+def ingest_interactions(path: str = INTERACTIONS_CSV, dry_run: bool = False, batch_size: int = INGEST_BATCH_SIZE):
+    collection = get_collection(INTERACTION_COLLECTION)
+    summary = sync_collection(collection, read_interactions(path), dry_run, batch_size)
+    print(f"{INTERACTION_COLLECTION}: {summary}")
+    return collection
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incrementally sync a customer CSV into ChromaDB.")
+    parser.add_argument("dataset", choices=["policies", "interactions"])
+    parser.add_argument("--csv", help="path to the source CSV")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="documents embedded and written per batch")
+    args = parser.parse_args()
+
+    if args.dataset == "policies":
+        ingest_policies(args.csv or POLICIES_CSV, args.dry_run, args.batch_size)
+    else:
+        ingest_interactions(args.csv or INTERACTIONS_CSV, args.dry_run, args.batch_size)
@@ -4,7 +4,7 @@
 
 import instructor
 from pydantic import BaseModel, Field
-from groq import Groq
+from llm_client import get_groq_client
 from enum import Enum
 from typing import List
 from dotenv import load_dotenv
@@ -73,7 +73,7 @@ John Doe
 # --------------------------------------------------------------
 load_dotenv()
 
-client = Groq()
+client = get_groq_client()
 
 """
 Objective: Develop an AI-powered ticket classification system that:
@@ -4,7 +4,7 @@
 
 import instructor
 from pydantic import BaseModel, Field
-from groq import Groq
+from llm_client import get_groq_client
 from enum import Enum
 from typing import List
 from dotenv import load_dotenv
@@ -14,11 +14,14 @@ import tiktoken
 
 # Initialize ChromaDB client
 from chromadb.config import Settings
+from embedding_cache import get_embedding_function
 
 chroma_client = chromadb.PersistentClient(path="my_vectordb")
 
-collection_customer_interaction = chroma_client.get_or_create_collection(name="customer_interaction")
-collection_customer_policies = chroma_client.get_or_create_collection(name="customer_policies")
+# Query with the same (cached) all-mpnet-base-v2 embeddings the collections were built with
+embedding_fn = get_embedding_function()
+collection_customer_interaction = chroma_client.get_or_create_collection(name="customer_interaction", embedding_function=embedding_fn)
+collection_customer_policies = chroma_client.get_or_create_collection(name="customer_policies", embedding_function=embedding_fn)
 
 # Sample customer support tickets
 ticket1 = """
@@ -86,7 +89,7 @@ John Doe
 # --------------------------------------------------------------
 load_dotenv()
 
-client = Groq()
+client = get_groq_client()
 
 """
 Objective: Develop an AI-powered ticket classification system that:
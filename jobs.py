@@ -0,0 +1,280 @@
+# jobs.py
+
+"""
+SQLite-backed job queue for large classification batches.
+
+A job is a list of (channel, message_content) rows stored on disk. Background
+workers claim queued jobs and classify them chunk by chunk with the classify3
+pipeline, committing each chunk's results before moving on, so a worker restart
+resumes from the first unfinished row instead of reprocessing the whole batch.
+
+Several processes (e.g. uvicorn --workers N) may share one database. A job is claimed
+atomically by one owner and held under a lease that the owner's pool keeps renewing;
+a job whose lease has expired (its process died) is claimed again by whoever is free,
+and rows already done are never redone or counted twice.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "50"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+# A running job whose owner hasn't renewed its lease for this long is considered abandoned
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+RESULT_COLUMNS = ["channel", "message_content", "target_label", "routing_info", "processing_cost", "chroma_vector_id"]
+
+
+class JobStore:
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self._lock = threading.Lock()
+        # Waits for other processes' write transactions instead of failing with "database is locked"
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total_rows INTEGER NOT NULL,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                run_started_at REAL,
+                run_start_rows INTEGER NOT NULL DEFAULT 0,
+                finished_at REAL,
+                error TEXT,
+                owner TEXT,
+                lease_expires_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_rows (
+                job_id TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                channel TEXT,
+                message_content TEXT,
+                target_label TEXT,
+                routing_info TEXT,
+                processing_cost REAL,
+                chroma_vector_id TEXT,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, row_index)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            """
+        )
+        # Databases created before leases existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_expires_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+
+    def create(self, logs: List[Tuple[str, str]]) -> str:
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, total_rows, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, len(logs), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_rows (job_id, row_index, channel, message_content) VALUES (?, ?, ?, ?)",
+                [(job_id, i, str(channel), str(message)) for i, (channel, message) in enumerate(logs)],
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim_next(self, owner: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[str]:
+        """
+        Claim the oldest queued job, or a running one whose lease has expired, for `owner`.
+        Atomic across processes: the write lock is held from the SELECT to the COMMIT.
+        """
+        # Jobs left 'running' before leases existed have no lease and count as abandoned
+        claimable = "(status = 'queued' OR (status = 'running' AND COALESCE(lease_expires_at, 0) < ?))"
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id, rows_done FROM jobs WHERE {claimable} ORDER BY created_at LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.commit()
+                    return None
+                job_id, rows_done = row
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_expires_at = ?, run_started_at = ?, run_start_rows = ? "
+                    f"WHERE id = ? AND {claimable}",
+                    (owner, now + lease_seconds, now, rows_done, job_id, now),
+                ).rowcount
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return job_id if claimed == 1 else None
+
+    def renew_leases(self, owner: str, lease_seconds: float = JOB_LEASE_SECONDS):
+        """Extend the lease on every job `owner` is running."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, owner),
+            )
+            self._conn.commit()
+
+    def release(self, job_id: str, owner: str):
+        """Hand a job `owner` is running back to the queue (e.g. on shutdown); its finished rows are kept."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires_at = NULL "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (job_id, owner),
+            )
+            self._conn.commit()
+
+    def pending_rows(self, job_id: str, limit: int) -> List[Tuple[int, str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row_index, channel, message_content FROM job_rows "
+                "WHERE job_id = ? AND done = 0 ORDER BY row_index LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+
+    def complete_rows(self, job_id: str, row_indexes: List[int], labels, routing_info, processing_costs, chroma_ids):
+        # Row results and job progress are committed together so progress never overstates what is on disk.
+        # Rows another worker finished meanwhile (after a lease expired) are left alone and not counted again
+        with self._lock:
+            rows_changed, cost_changed = 0, 0.0
+            try:
+                for row_index, label, routing, cost, chroma_id in zip(row_indexes, labels, routing_info, processing_costs, chroma_ids):
+                    changed = self._conn.execute(
+                        "UPDATE job_rows SET target_label = ?, routing_info = ?, processing_cost = ?, chroma_vector_id = ?, done = 1 "
+                        "WHERE job_id = ? AND row_index = ? AND done = 0",
+                        (label, routing, float(cost), chroma_id, job_id, row_index),
+                    ).rowcount
+                    rows_changed += changed
+                    cost_changed += float(cost) * changed
+                self._conn.execute(
+                    "UPDATE jobs SET rows_done = rows_done + ?, cost = cost + ? WHERE id = ?",
+                    (rows_changed, cost_changed, job_id),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def finish(self, job_id: str, owner: str, error: Optional[str] = None):
+        with self._lock:
+            # Only the current owner finishes a job; a worker whose lease was taken over just stops
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_expires_at = NULL "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                ("failed" if error else "done", time.time(), error, job_id, owner),
+            )
+            self._conn.commit()
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, total_rows, rows_done, cost, created_at, run_started_at, run_start_rows, finished_at, error "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        status, total_rows, rows_done, cost, created_at, run_started_at, run_start_rows, finished_at, error = row
+        eta_seconds = None
+        # Rate is measured over the current run only, so time spent queued or before a restart doesn't skew it
+        rows_this_run = rows_done - run_start_rows
+        if status == "running" and rows_this_run > 0:
+            rate = rows_this_run / (time.time() - run_started_at)
+            eta_seconds = (total_rows - rows_done) / rate
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total_rows": total_rows,
+            "rows_done": rows_done,
+            "cost": cost,
+            "eta_seconds": eta_seconds,
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "error": error,
+        }
+
+    def results(self, job_id: str) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {', '.join(RESULT_COLUMNS)} FROM job_rows WHERE job_id = ? ORDER BY row_index",
+                (job_id,),
+            ).fetchall()
+
+
+class JobWorkerPool:
+    """Background threads that drain the job queue using classify3.classify."""
+
+    def __init__(self, store: JobStore, classify, workers: int = JOB_WORKERS, chunk_size: int = JOB_CHUNK_SIZE):
+        self.store = store
+        self.classify = classify
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # Identifies this pool's claims in a database shared by several processes
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _heartbeat(self):
+        # Renew well before expiry, so a slow chunk never lets another process take the job
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                self.store.renew_leases(self.owner)
+            except sqlite3.Error as e:
+                print("❌ Job lease renewal failed:", e)
+
+    def _run(self):
+        while not self._stop.is_set():
+            job_id = self.store.claim_next(self.owner)
+            if job_id is None:
+                self._stop.wait(JOB_POLL_SECONDS)
+                continue
+            self._process(job_id)
+
+    def _process(self, job_id: str):
+        try:
+            while True:
+                if self._stop.is_set():
+                    # Hand it back so any running process can resume from the first unfinished row
+                    self.store.release(job_id, self.owner)
+                    return
+                rows = self.store.pending_rows(job_id, self.chunk_size)
+                if not rows:
+                    break
+                row_indexes = [row_index for row_index, _, _ in rows]
+                logs = [(channel, message) for _, channel, message in rows]
+                labels, routing_info, processing_costs, chroma_ids = self.classify(logs)
+                self.store.complete_rows(job_id, row_indexes, labels, routing_info, processing_costs, chroma_ids)
+            self.store.finish(job_id, self.owner)
+        except Exception as e:
+            print(f"❌ Job {job_id} failed:", e)
+            self.store.finish(job_id, self.owner, error=str(e))
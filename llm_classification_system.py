@@ -4,7 +4,7 @@
 
 import instructor
 from pydantic import BaseModel, Field
-from groq import Groq
+from llm_client import get_groq_client
 from enum import Enum
 from typing import List
 from dotenv import load_dotenv
@@ -25,7 +25,7 @@ Can you please help me regain access to my account? I've been a loyal customer f
 # --------------------------------------------------------------
 load_dotenv()
 
-client = Groq()
+client = get_groq_client()
 
 
 def classify_ticket_simple(ticket_text: str) -> str:
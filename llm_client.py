@@ -0,0 +1,105 @@
+# llm_client.py
+
+"""
+Shared Groq client factory.
+
+Every entry point gets its Groq client from here, so the process keeps a single
+httpx connection pool: connections (and their TLS sessions) are kept alive and reused
+across threads instead of being re-established per client. The pool is sized to the
+configured concurrency, HTTP/2 is used when the optional h2 package is installed, and
+connect / read timeouts are explicit.
+
+httpx, groq and instructor are imported on first use, so importing this module is free.
+"""
+
+import importlib.util
+import os
+import threading
+
+# Connections in the shared pool. Scheduled requests are capped at this many in flight
+# (llm_scheduler.LLM_MAX_CONCURRENT), so extra batch / job threads queue there instead of
+# timing out waiting for a connection
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", os.getenv("CLASSIFY_MAX_IN_FLIGHT", "8")))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+# How long a request may wait for a free pooled connection
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "30"))
+# SDK-level retries (connection errors, 5xx, 429) for callers that don't go through llm_scheduler
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_lock = threading.Lock()
+_http_client = None
+_groq_client = None
+_instructor_clients = {}
+
+
+def llm_timeout():
+    import httpx
+
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT, pool=LLM_POOL_TIMEOUT)
+
+
+def get_http_client():
+    """The process-wide connection pool (an httpx.Client) used by every Groq client."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    http2=LLM_HTTP2,
+                    timeout=llm_timeout(),
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_SIZE,
+                        max_keepalive_connections=LLM_POOL_SIZE,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+                    ),
+                )
+    return _http_client
+
+
+def get_groq_client():
+    """The process-wide raw Groq client (thread-safe; share it rather than creating new ones)."""
+    global _groq_client
+    if _groq_client is None:
+        from groq import Groq
+
+        http_client = get_http_client()
+        with _lock:
+            if _groq_client is None:
+                _groq_client = Groq(http_client=http_client, timeout=llm_timeout(), max_retries=LLM_MAX_RETRIES)
+    return _groq_client
+
+
+def get_instructor_client(max_retries: int = LLM_MAX_RETRIES):
+    """
+    An instructor-patched Groq client on the shared pool.
+
+    Pass max_retries=0 when requests go through llm_scheduler, which handles 429s itself;
+    SDK retries would otherwise hammer the provider behind the scheduler's back.
+    """
+    client = _instructor_clients.get(max_retries)
+    if client is None:
+        import instructor
+
+        groq_client = get_groq_client()
+        if max_retries != LLM_MAX_RETRIES:
+            # with_options copies the client but keeps its http_client, so the pool is still shared
+            groq_client = groq_client.with_options(max_retries=max_retries)
+        with _lock:
+            client = _instructor_clients.setdefault(max_retries, instructor.from_groq(groq_client))
+    return client
+
+
+def close():
+    """Close the shared pool (e.g. on server shutdown)."""
+    global _http_client, _groq_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _groq_client = None
+        _instructor_clients.clear()
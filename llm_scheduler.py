@@ -0,0 +1,293 @@
+# llm_scheduler.py
+
+"""
+Rate-limit-aware scheduling of LLM requests.
+
+Requests wait in a priority queue until both the requests-per-minute and the
+tokens-per-minute token buckets can cover them, so a parallel batch stays under the
+provider limits instead of triggering 429s. Both limits are off by default; set
+LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE to the RPM / TPM your provider
+account has for LLM_MODEL (on Groq, the organization's Limits page lists them per model
+and tier), a little below them to leave headroom for other clients on the same key.
+Each request reserves its input tokens plus LLM_OUTPUT_TOKEN_ESTIMATE; once the response
+reports its actual usage, the difference is credited back (or charged). When a 429 does
+come back, the whole
+scheduler pauses for the Retry-After period (or an exponential backoff) and the request
+is retried, instead of every worker retrying blindly at once. Requests in flight are also
+capped at the shared connection pool's size, since every batch and job worker shares that
+pool: beyond it, threads queue here (in priority order) rather than time out waiting for
+a connection. Other transient failures (connection errors, timeouts, 5xx) are retried per
+request with a short backoff, as the SDK's own retries would, which are off for scheduled
+requests so they can't retry 429s behind the scheduler's back.
+
+Tickets are ordered by a cheap keyword pre-score, so critical-looking tickets go first
+when the queue backs up.
+"""
+
+import heapq
+import itertools
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from llm_client import LLM_MAX_RETRIES, LLM_POOL_SIZE
+
+# Provider limits; 0 (the default) disables a limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Output tokens are unknown up front, so each request reserves this many on top of its input tokens
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "400"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+# Concurrent requests across the process; 0 disables the cap
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", str(LLM_POOL_SIZE)))
+# Retries for connection errors, timeouts and 5xx; same default as the SDK's own retries
+LLM_TRANSIENT_RETRIES = int(os.getenv("LLM_TRANSIENT_RETRIES", str(LLM_MAX_RETRIES)))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+TRANSIENT_BACKOFF_SECONDS = 0.5
+# groq / openai SDK (APITimeoutError subclasses APIConnectionError) and raw httpx transport errors
+TRANSIENT_ERROR_TYPES = {"APIConnectionError", "TransportError"}
+
+# Cheap urgency signals for ordering the queue; the LLM still decides the actual urgency
+URGENT_TERMS = re.compile(
+    r"\b(urgent|urgently|immediately|asap|emergency|critical|hospital|surgery|lawyer|legal action|fraud|"
+    r"cancel|cancell?ation|denied|unacceptable|right now|today)\b",
+    re.IGNORECASE,
+)
+
+
+def priority_score(ticket_text: str) -> int:
+    """Higher scores are scheduled first."""
+    score = 2 * len(URGENT_TERMS.findall(ticket_text))
+    score += min(ticket_text.count("!"), 3)
+    # Shouting: several fully upper-case words
+    score += int(len(re.findall(r"\b[A-Z]{3,}\b", ticket_text)) >= 3)
+    return score
+
+
+def rate_limit_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Return the Retry-After delay (0 when the header is missing) if `error`, or any
+    exception it wraps, is a 429 from the provider; None for any other error.
+    """
+    while error is not None:
+        if getattr(error, "status_code", None) == 429:
+            response = getattr(error, "response", None)
+            headers = getattr(response, "headers", None) or {}
+            try:
+                return float(headers.get("retry-after", 0))
+            except ValueError:
+                # An HTTP date instead of seconds; fall back to our own backoff
+                return 0.0
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """True if `error`, or any exception it wraps, is one the SDK would retry (other than a 429)."""
+    while error is not None:
+        status_code = getattr(error, "status_code", None)
+        if status_code in (408, 409) or (isinstance(status_code, int) and status_code >= 500):
+            return True
+        # Matched by name so this module doesn't import the SDKs
+        if any(cls.__name__ in TRANSIENT_ERROR_TYPES for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def usage_tokens(result) -> Optional[int]:
+    """Total tokens the provider reports for a response (instructor keeps it as _raw_response), if any."""
+    usage = getattr(getattr(result, "_raw_response", None), "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return total if isinstance(total, int) else None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.refill_per_second = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now); unlimited buckets never wait."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # A request larger than the bucket could never fit; it waits for a full bucket instead
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.refill_per_second)
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def credit(self, amount: float):
+        """Give back (or, when negative, charge) tokens after a reservation turned out wrong."""
+        if self.capacity > 0:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_RATE_LIMIT_RETRIES,
+        max_concurrent: int = LLM_MAX_CONCURRENT,
+        transient_retries: int = LLM_TRANSIENT_RETRIES,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.max_concurrent = max_concurrent
+        self.transient_retries = transient_retries
+        self.in_flight = 0
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._consecutive_rate_limits = 0
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.transient_failures = 0
+        self.max_queue_depth = 0
+        self._waits = deque(maxlen=1000)
+
+    def acquire(self, tokens: int, priority: int = 0):
+        """
+        Block until this request is first in line, a concurrency slot is free and both budgets
+        can cover it. Every acquire must be paired with a release once the request is done.
+        """
+        enqueued = time.monotonic()
+        # Highest priority first, FIFO within a priority
+        entry = (-priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    timeout = None
+                    # At the concurrency cap the head waits for a release, which notifies
+                    if self._queue[0] == entry and not (0 < self.max_concurrent <= self.in_flight):
+                        now = time.monotonic()
+                        timeout = max(
+                            self._paused_until - now,
+                            self.request_bucket.wait_time(1, now),
+                            self.token_bucket.wait_time(tokens, now),
+                        )
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+            except BaseException:
+                # Don't leave an abandoned entry blocking the head of the queue
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._queue)
+            self.request_bucket.take(1)
+            self.token_bucket.take(tokens)
+            self.in_flight += 1
+            self.requests += 1
+            self._waits.append(time.monotonic() - enqueued)
+            # Let the next request in line re-check the budgets
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_rate_limited(self, retry_after: float):
+        with self._cond:
+            self.rate_limited += 1
+            self._consecutive_rate_limits += 1
+            backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (self._consecutive_rate_limits - 1))
+            # The provider's Retry-After wins when it asks for longer than our own backoff
+            self._paused_until = max(self._paused_until, time.monotonic() + max(retry_after, backoff))
+            # The server's budget is evidently spent; stop the buckets from bursting right after the pause
+            self.request_bucket.tokens = min(self.request_bucket.tokens, 0)
+            self.token_bucket.tokens = min(self.token_bucket.tokens, 0)
+
+    def on_success(self, reserved_tokens: int = 0, used_tokens: Optional[int] = None):
+        with self._cond:
+            self._consecutive_rate_limits = 0
+            if used_tokens is not None:
+                self.token_bucket.credit(min(reserved_tokens, self.token_bucket.capacity) - used_tokens)
+                # Credited tokens may let the head of the queue go now
+                self._cond.notify_all()
+
+    def call(self, func: Callable, tokens: int, priority: int = 0, *args, **kwargs):
+        """
+        Run `func(*args, **kwargs)` within the budgets, retrying it after 429s (pausing the
+        whole scheduler) and after transient failures (backing off this request only).
+        """
+        rate_limits = transient_failures = 0
+        while True:
+            self.acquire(tokens, priority)
+            delay = 0.0
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retry_after = rate_limit_retry_after(e)
+                if retry_after is not None and rate_limits < self.max_retries:
+                    rate_limits += 1
+                    self.on_rate_limited(retry_after)
+                elif retry_after is None and transient_failures < self.transient_retries and is_transient_error(e):
+                    delay = TRANSIENT_BACKOFF_SECONDS * 2 ** transient_failures
+                    transient_failures += 1
+                    with self._cond:
+                        self.transient_failures += 1
+                else:
+                    raise
+            else:
+                self.on_success(tokens, usage_tokens(result))
+                return result
+            finally:
+                self.release()
+            # Back off outside the concurrency slot, so other requests can use it meanwhile
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": len(self._queue),
+                "in_flight": self.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "transient_failures": self.transient_failures,
+                "paused_for_seconds": max(0.0, self._paused_until - time.monotonic()),
+                "wait_seconds_mean": statistics.fmean(waits) if waits else 0.0,
+                "wait_seconds_p95": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_seconds_max": waits[-1] if waits else 0.0,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler, so every caller shares one set of provider budgets."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
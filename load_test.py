@@ -0,0 +1,85 @@
+# load_test.py
+
+"""
+Concurrent-request load test for the /classify/ servers.
+
+Fires N concurrent CSV uploads at /classify/ and, while they are in flight, probes
+/health on a fixed interval. With classification running on the event loop the
+health probes queue behind the uploads; with it on the worker pool they stay fast.
+
+Usage (against a running server, e.g. `uvicorn server3:app --port 8000`):
+    python load_test.py --url http://127.0.0.1:8000 --csv test.csv --concurrency 4
+Run it once against the old server and once against the new one to compare.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def summarize(name: str, latencies):
+    if not latencies:
+        print(f"{name}: no samples")
+        return
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{name}: n={len(latencies)} "
+        f"p50={statistics.median(latencies) * 1000:.1f}ms "
+        f"p95={p95 * 1000:.1f}ms "
+        f"max={latencies[-1] * 1000:.1f}ms"
+    )
+
+
+async def upload(client: httpx.AsyncClient, url: str, payload: bytes, filename: str, latencies):
+    start = time.perf_counter()
+    response = await client.post(f"{url}/classify/", files={"file": (filename, payload, "text/csv")})
+    latencies.append(time.perf_counter() - start)
+    response.raise_for_status()
+
+
+async def probe_health(client: httpx.AsyncClient, url: str, interval: float, done: asyncio.Event, latencies):
+    while not done.is_set():
+        start = time.perf_counter()
+        # Status is not checked: servers without /health still answer 404, and that
+        # response time shows how long the event loop was blocked just as well
+        await client.get(f"{url}/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def run(url: str, csv_path: str, concurrency: int, interval: float):
+    with open(csv_path, "rb") as f:
+        payload = f.read()
+
+    upload_latencies = []
+    health_latencies = []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        prober = asyncio.create_task(probe_health(client, url, interval, done, health_latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            upload(client, url, payload, csv_path, upload_latencies) for _ in range(concurrency)
+        ))
+        wall_time = time.perf_counter() - start
+        done.set()
+        await prober
+
+    print(f"{concurrency} concurrent uploads of {csv_path} finished in {wall_time:.2f}s")
+    summarize("upload", upload_latencies)
+    summarize("health", health_latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--csv", default="test.csv")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between /health probes")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.csv, args.concurrency, args.interval))
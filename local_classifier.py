@@ -0,0 +1,216 @@
+# local_classifier.py
+
+"""
+Local first-stage ticket classifier.
+
+A nearest-centroid model over the all-mpnet-base-v2 embeddings we already compute for
+retrieval, trained from past LLM results (an output_with_chroma.csv-style file with
+message_content and target_label columns). It predicts category, urgency and sentiment on
+CPU; tickets where any prediction falls below the confidence threshold are escalated to the LLM.
+
+Usage:
+    python local_classifier.py train [--csv output_with_chroma.csv] [--out local_classifier.npz]
+    python local_classifier.py evaluate [--csv output_with_chroma.csv] [--threshold 0.8]
+"""
+
+import argparse
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ticket_classifier import TicketClassification
+
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "local_classifier.npz")
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_CONFIDENCE_THRESHOLD", "0.8"))
+# Sharpens cosine similarities before the softmax; cosine gaps between classes are small
+LOCAL_TEMPERATURE = float(os.getenv("LOCAL_TEMPERATURE", "20"))
+
+HEADS = ("category", "urgency", "sentiment")
+# Ends the suggested_action of local predictions, so they are never fed back in as training labels
+LOCAL_ACTION_MARKER = "(classified locally, no LLM analysis)"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_training_data(path: str) -> Tuple[List[str], Dict[str, List[str]]]:
+    """Read ticket texts and their LLM labels, skipping invalid target_label JSON and local predictions."""
+    # Only needed for training, so serving doesn't pay for the import
+    import pandas as pd
+
+    df = pd.read_csv(path, encoding='ISO-8859-1')
+    texts = []
+    labels = {head: [] for head in HEADS}
+    for message, target_label in zip(df["message_content"], df["target_label"]):
+        try:
+            label = json.loads(target_label)
+        except (TypeError, json.JSONDecodeError):
+            continue
+        if not all(head in label for head in HEADS) or str(label.get("suggested_action", "")).endswith(LOCAL_ACTION_MARKER):
+            continue
+        texts.append(message)
+        for head in HEADS:
+            labels[head].append(label[head])
+    return texts, labels
+
+
+class LocalClassifier:
+    def __init__(self, centroids: Dict[str, np.ndarray], classes: Dict[str, List[str]], threshold: float = LOCAL_CONFIDENCE_THRESHOLD):
+        self.centroids = centroids
+        self.classes = classes
+        self.threshold = threshold
+
+        self._lock = threading.Lock()
+        self.served_locally = 0
+        self.escalated = 0
+        self.escalated_cost = 0.0
+        self.agreement = {head: [0, 0] for head in HEADS}
+
+    @classmethod
+    def train(cls, embeddings, labels: Dict[str, List[str]], threshold: float = LOCAL_CONFIDENCE_THRESHOLD) -> "LocalClassifier":
+        embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        centroids = {}
+        classes = {}
+        for head in HEADS:
+            head_labels = np.asarray(labels[head])
+            classes[head] = sorted(set(labels[head]))
+            centroids[head] = _normalize_rows(np.stack([
+                embeddings[head_labels == label].mean(axis=0) for label in classes[head]
+            ]))
+        return cls(centroids, classes, threshold)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_CLASSIFIER_PATH, threshold: float = LOCAL_CONFIDENCE_THRESHOLD) -> "LocalClassifier":
+        data = np.load(path)
+        centroids = {head: data[f"{head}_centroids"] for head in HEADS}
+        classes = {head: [str(label) for label in data[f"{head}_classes"]] for head in HEADS}
+        return cls(centroids, classes, threshold)
+
+    def save(self, path: str = LOCAL_CLASSIFIER_PATH):
+        arrays = {}
+        for head in HEADS:
+            arrays[f"{head}_centroids"] = self.centroids[head]
+            arrays[f"{head}_classes"] = np.asarray(self.classes[head])
+        np.savez(path, **arrays)
+
+    def predict(self, embeddings) -> List[Dict[str, Tuple[str, float]]]:
+        """Return {head: (label, confidence)} for each embedding."""
+        embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        predictions = [{} for _ in range(len(embeddings))]
+        for head in HEADS:
+            probabilities = _softmax(embeddings @ self.centroids[head].T * LOCAL_TEMPERATURE)
+            best = probabilities.argmax(axis=1)
+            for i, (index, row) in enumerate(zip(best, probabilities)):
+                predictions[i][head] = (self.classes[head][index], float(row[index]))
+        return predictions
+
+    def confident(self, prediction: Dict[str, Tuple[str, float]]) -> bool:
+        return min(confidence for _, confidence in prediction.values()) >= self.threshold
+
+    @staticmethod
+    def to_classification(prediction: Dict[str, Tuple[str, float]]) -> Optional[TicketClassification]:
+        category = prediction["category"][0]
+        try:
+            return TicketClassification(
+                category=category,
+                urgency=prediction["urgency"][0],
+                sentiment=prediction["sentiment"][0],
+                confidence=min(confidence for _, confidence in prediction.values()),
+                key_information=[],
+                suggested_action=f"Review {category.replace('_', ' ')} request {LOCAL_ACTION_MARKER}",
+            )
+        except ValueError:
+            # Labels from an older schema that TicketClassification no longer accepts
+            return None
+
+    def record_local(self, count: int = 1):
+        with self._lock:
+            self.served_locally += count
+
+    def record_escalation(self, prediction: Dict[str, Tuple[str, float]], classification: TicketClassification, cost: float):
+        """Track an escalated ticket's LLM cost and whether the local prediction agreed with the LLM."""
+        llm_labels = {
+            "category": classification.category.value,
+            "urgency": classification.urgency.value,
+            "sentiment": classification.sentiment.value,
+        }
+        with self._lock:
+            self.escalated += 1
+            self.escalated_cost += cost
+            for head in HEADS:
+                self.agreement[head][0] += int(prediction[head][0] == llm_labels[head])
+                self.agreement[head][1] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.served_locally + self.escalated
+            average_llm_cost = self.escalated_cost / self.escalated if self.escalated else 0.0
+            return {
+                "threshold": self.threshold,
+                "tickets": total,
+                "served_locally": self.served_locally,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / total if total else 0.0,
+                # Locally served tickets would have cost about what escalated ones did
+                "estimated_saved_cost": self.served_locally * average_llm_cost,
+                # Measured on escalated tickets, the only ones where both predictions exist
+                "agreement_on_escalated": {
+                    head: agree / seen if seen else None for head, (agree, seen) in self.agreement.items()
+                },
+            }
+
+
+def evaluate(embeddings, labels: Dict[str, List[str]], threshold: float) -> dict:
+    """Leave-one-out evaluation: escalation rate and agreement with the LLM labels on locally served tickets."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    served = 0
+    agree = {head: 0 for head in HEADS}
+    for i in range(len(embeddings)):
+        rest = [j for j in range(len(embeddings)) if j != i]
+        rest_labels = {head: [labels[head][j] for j in rest] for head in HEADS}
+        # A label seen only in the held-out row can't be predicted; that counts against the model
+        model = LocalClassifier.train(embeddings[rest], rest_labels, threshold)
+        prediction = model.predict(embeddings[i:i + 1])[0]
+        if model.confident(prediction):
+            served += 1
+            for head in HEADS:
+                agree[head] += int(prediction[head][0] == labels[head][i])
+
+    total = len(embeddings)
+    return {
+        "tickets": total,
+        "threshold": threshold,
+        "escalation_rate": (total - served) / total if total else 0.0,
+        "agreement_on_local": {head: agree[head] / served if served else None for head in HEADS},
+    }
+
+
+if __name__ == '__main__':
+    from embedding_cache import get_embedding_function
+
+    parser = argparse.ArgumentParser(description="Train or evaluate the local first-stage classifier.")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--csv", default="output_with_chroma.csv")
+    parser.add_argument("--out", default=LOCAL_CLASSIFIER_PATH)
+    parser.add_argument("--threshold", type=float, default=LOCAL_CONFIDENCE_THRESHOLD)
+    args = parser.parse_args()
+
+    texts, labels = load_training_data(args.csv)
+    embeddings = get_embedding_function()(texts)
+
+    if args.command == "train":
+        LocalClassifier.train(embeddings, labels, args.threshold).save(args.out)
+        print(f"Trained on {len(texts)} tickets, saved to {args.out}")
+    else:
+        print(evaluate(embeddings, labels, args.threshold))
@@ -1,12 +1,22 @@
 import json
+import threading
+
+import pandas as pd
+
+from routing_rules import OUTPUT_FIELDS, RoutingRules
+
+_routing_rules = None
+_routing_rules_lock = threading.Lock()
 
 class MessageRouter:
+    # Built-in rules, used when no routing rules file exists; keys are TicketCategory values
     CATEGORY_ROUTING = {
+        "claim_denial": "Claims Department",
         "coverage_inquiry": "Product Support Team",
-        "claim_status": "Claims Department",
+        "dependent_coverage_issue": "Product Support Team",
         "billing_issue": "Billing Team",
-        "technical_issue": "IT Support",
-        "general_question": "Customer Service",
+        "account_access": "IT Support",
+        "other": "Customer Service",
     }
 
     URGENCY_ESCALATION = {
@@ -16,9 +26,13 @@ class MessageRouter:
         "critical": "Immediate Attention Desk"
     }
 
-    def __init__(self, raw_message: str):
+    DEFAULT_TEAM = "Customer Service"
+    DEFAULT_URGENCY_LEVEL = "Standard Queue"
+
+    def __init__(self, raw_message: str, channel: str = None):
         self.raw_message = raw_message
         self.message = self._parse_json(raw_message)
+        self.channel = channel
 
     def _parse_json(self, raw_message: str) -> dict:
         try:
@@ -27,12 +41,33 @@ class MessageRouter:
             print("❌ Invalid JSON:", e)
             return {}
 
-    def route(self) -> dict:
-        category = self.message.get("category", "general_question")
-        urgency = self.message.get("urgency", "low")
+    @classmethod
+    def rules(cls):
+        """The compiled routing decision table, reloaded when the rules file changes."""
+        global _routing_rules
+        if _routing_rules is None:
+            with _routing_rules_lock:
+                if _routing_rules is None:
+                    _routing_rules = RoutingRules(fallback=cls.builtin_rules())
+        return _routing_rules.current()
+
+    @classmethod
+    def builtin_rules(cls) -> dict:
+        rules = [{"match": {"category": category}, "assigned_team": team} for category, team in cls.CATEGORY_ROUTING.items()]
+        rules += [{"match": {"urgency": urgency}, "urgency_level": level} for urgency, level in cls.URGENCY_ESCALATION.items()]
+        return {
+            "defaults": {"assigned_team": cls.DEFAULT_TEAM, "urgency_level": cls.DEFAULT_URGENCY_LEVEL},
+            "rules": rules,
+        }
 
-        assigned_team = self.CATEGORY_ROUTING.get(category, "Customer Service")
-        urgency_level = self.URGENCY_ESCALATION.get(urgency, "Standard Queue")
+    def route(self) -> dict:
+        assigned_team, urgency_level = self.rules().lookup(
+            self.message.get("category"),
+            self.message.get("urgency"),
+            self.message.get("sentiment"),
+            self.message.get("confidence"),
+            self.channel,
+        )
 
         return {
             "assigned_team": assigned_team,
@@ -43,6 +78,41 @@ class MessageRouter:
         routing_info = self.route()
         return f"📬 Routed to: {routing_info['assigned_team']} ⏱ Urgency Level: {routing_info['urgency_level']}"
 
+    # Batch routing: whole columns at once, no JSON round-trip or router object per row
+
+    @classmethod
+    def route_frame(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Route every row of a DataFrame with category / urgency columns and optional
+        sentiment, confidence and channel columns; same result as route() per row.
+        """
+        def column(name):
+            return df[name].tolist() if name in df.columns else [None] * len(df)
+
+        routes = cls.rules().lookup_many(
+            column("category"), column("urgency"), column("sentiment"), column("confidence"), column("channel"),
+        )
+        return pd.DataFrame(routes, columns=list(OUTPUT_FIELDS), index=df.index)
+
+    @classmethod
+    def route_classifications(cls, classifications, channels=None) -> pd.DataFrame:
+        """Route typed TicketClassification objects (enum or plain string fields)."""
+        # Enum members don't hash like their values, so look up by value
+        frame = pd.DataFrame({
+            "category": [getattr(c.category, "value", c.category) for c in classifications],
+            "urgency": [getattr(c.urgency, "value", c.urgency) for c in classifications],
+            "sentiment": [getattr(c.sentiment, "value", c.sentiment) for c in classifications],
+            "confidence": [c.confidence for c in classifications],
+        })
+        if channels is not None:
+            frame["channel"] = list(channels)
+        return cls.route_frame(frame)
+
+    @staticmethod
+    def format_routing(routes: pd.DataFrame) -> pd.Series:
+        """The display_routing() text for every routed row."""
+        return "📬 Routed to: " + routes["assigned_team"] + " ⏱ Urgency Level: " + routes["urgency_level"]
+
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+# result_response.py
+
+"""
+Build HTTP responses for classified dataframes straight from memory.
+
+The output format is picked from an explicit `output_format` value or, failing that,
+the request's Accept header, and defaults to CSV as before.
+"""
+
+import io
+from typing import Optional
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+ACCEPT_FORMATS = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+def negotiate_format(request: Request, output_format: Optional[str] = None) -> str:
+    if output_format:
+        if output_format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"output_format must be one of {', '.join(MEDIA_TYPES)}.")
+        return output_format
+
+    # First supported media type in the Accept header wins; q-values are not weighed
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type in ACCEPT_FORMATS:
+            return ACCEPT_FORMATS[media_type]
+    return "csv"
+
+
+def serialize_dataframe(df: pd.DataFrame, output_format: str) -> bytes:
+    if output_format == "json":
+        return df.to_json(orient="records", force_ascii=False).encode("utf-8")
+    if output_format == "parquet":
+        buffer = io.BytesIO()
+        try:
+            df.to_parquet(buffer, index=False)
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Parquet output requires pyarrow or fastparquet to be installed.")
+        return buffer.getvalue()
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def dataframe_response(body: bytes, output_format: str, filename: str = "classified") -> Response:
+    return Response(
+        content=body,
+        media_type=MEDIA_TYPES[output_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{output_format}"'},
+    )
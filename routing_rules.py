@@ -0,0 +1,184 @@
+# routing_rules.py
+
+"""
+Compiled, hot-reloadable routing rules.
+
+Rules are read from a JSON (or, with PyYAML installed, YAML) file. Each rule matches on
+any of category, urgency, sentiment and channel (a value or a list of values) and on
+confidence bounds (min_confidence <= confidence < max_confidence), and sets assigned_team
+and/or urgency_level. For each output the first matching rule wins; `defaults` fill in
+the rest. The shipped routing_rules.json reproduces MessageRouter's built-in mapping;
+business rules go before the catch-all category / urgency rules, e.g. to fast-track
+angry customers:
+
+    {"match": {"sentiment": "angry", "urgency": ["high", "critical"]}, "urgency_level": "Immediate Attention Desk"}
+
+The rules are compiled into a decision table over every combination of known values and
+confidence bands, so routing a ticket is one dict lookup plus a bisect over the (few)
+confidence breakpoints. The file is re-checked at most every ROUTING_RULES_CHECK_SECONDS;
+a changed file is compiled in full and swapped in with a single assignment, and a file
+that fails to load leaves the previous table in place.
+"""
+
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from ticket_classifier import CustomerSentiment, TicketCategory, TicketUrgency
+
+ROUTING_RULES_PATH = os.getenv("ROUTING_RULES_PATH", "routing_rules.json")
+ROUTING_RULES_CHECK_SECONDS = float(os.getenv("ROUTING_RULES_CHECK_SECONDS", "1"))
+
+MATCH_FIELDS = ("category", "urgency", "sentiment", "channel")
+OUTPUT_FIELDS = ("assigned_team", "urgency_level")
+# Stands for every value a rule file doesn't mention (unknown channels, stale labels, missing fields)
+OTHER = "__other__"
+
+KNOWN_VALUES = {
+    "category": [category.value for category in TicketCategory],
+    "urgency": [urgency.value for urgency in TicketUrgency],
+    "sentiment": [sentiment.value for sentiment in CustomerSentiment],
+    "channel": [],
+}
+
+
+def _values(match: dict, field: str) -> Optional[set]:
+    if field not in match:
+        return None
+    value = match[field]
+    return set(value) if isinstance(value, list) else {value}
+
+
+class DecisionTable:
+    def __init__(self, config: dict):
+        rules = config.get("rules", [])
+        defaults = config.get("defaults", {})
+        for rule in rules:
+            unknown = set(rule.get("match", {})) - set(MATCH_FIELDS) - {"min_confidence", "max_confidence"}
+            if unknown:
+                raise ValueError(f"unknown match fields {sorted(unknown)} in rule {rule}")
+            if not any(field in rule for field in OUTPUT_FIELDS):
+                raise ValueError(f"rule sets neither assigned_team nor urgency_level: {rule}")
+
+        # Every value each field can take in a lookup key
+        self.domains = {}
+        for field in MATCH_FIELDS:
+            values = set(KNOWN_VALUES[field])
+            for rule in rules:
+                values |= _values(rule.get("match", {}), field) or set()
+            self.domains[field] = values
+
+        self.breakpoints = sorted({
+            float(rule["match"][bound])
+            for rule in rules
+            for bound in ("min_confidence", "max_confidence")
+            if bound in rule.get("match", {})
+        })
+
+        self.table = {}
+        bands = range(len(self.breakpoints) + 1)
+        for key in itertools.product(*(sorted(self.domains[field]) + [OTHER] for field in MATCH_FIELDS), bands):
+            self.table[key] = self._evaluate(rules, defaults, key)
+
+    def _band_bounds(self, band: int) -> Tuple[float, float]:
+        lower = self.breakpoints[band - 1] if band > 0 else float("-inf")
+        upper = self.breakpoints[band] if band < len(self.breakpoints) else float("inf")
+        return lower, upper
+
+    def _evaluate(self, rules: List[dict], defaults: dict, key: tuple) -> Tuple[str, str]:
+        fields = dict(zip(MATCH_FIELDS, key))
+        lower, upper = self._band_bounds(key[-1])
+        outputs = {}
+        for rule in rules:
+            match = rule.get("match", {})
+            if any(
+                (values := _values(match, field)) is not None and fields[field] not in values
+                for field in MATCH_FIELDS
+            ):
+                continue
+            # Breakpoints include every bound, so a band is either wholly inside a bound or wholly outside it
+            if "min_confidence" in match and lower < float(match["min_confidence"]):
+                continue
+            if "max_confidence" in match and upper > float(match["max_confidence"]):
+                continue
+            for field in OUTPUT_FIELDS:
+                if field in rule and field not in outputs:
+                    outputs[field] = rule[field]
+            if len(outputs) == len(OUTPUT_FIELDS):
+                break
+        return tuple(outputs.get(field, defaults.get(field)) for field in OUTPUT_FIELDS)
+
+    def lookup(self, category, urgency, sentiment=None, confidence=None, channel=None) -> Tuple[str, str]:
+        """(assigned_team, urgency_level) for one ticket; a missing confidence counts as fully confident."""
+        domains = self.domains
+        key = (
+            category if category in domains["category"] else OTHER,
+            urgency if urgency in domains["urgency"] else OTHER,
+            sentiment if sentiment in domains["sentiment"] else OTHER,
+            channel if channel in domains["channel"] else OTHER,
+            bisect.bisect_right(self.breakpoints, 1.0 if confidence is None else confidence),
+        )
+        return self.table[key]
+
+    def lookup_many(self, categories: Iterable, urgencies: Iterable, sentiments: Iterable, confidences: Iterable, channels: Iterable) -> List[Tuple[str, str]]:
+        return [self.lookup(*row) for row in zip(categories, urgencies, sentiments, confidences, channels)]
+
+
+def load_config(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        if path.endswith((".yaml", ".yml")):
+            # Optional dependency, only needed for YAML rule files
+            import yaml
+
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+class RoutingRules:
+    """A DecisionTable backed by a rules file, recompiled whenever the file changes."""
+
+    def __init__(self, path: str = ROUTING_RULES_PATH, fallback: Optional[dict] = None, check_seconds: float = ROUTING_RULES_CHECK_SECONDS):
+        self.path = path
+        self.fallback = fallback or {"rules": [], "defaults": {}}
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self.last_error = None
+        self.table = DecisionTable(self.fallback)
+        self.reload_if_changed()
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                table = DecisionTable(load_config(self.path) if mtime is not None else self.fallback)
+            except Exception as e:
+                # Keep routing with the last good table until the file is fixed
+                self.last_error = f"{self.path}: {e}"
+                print(f"❌ Routing rules not reloaded: {self.last_error}")
+            else:
+                self.table = table
+                self.last_error = None
+                self.reloads += 1
+            self._mtime = mtime
+
+    def current(self) -> DecisionTable:
+        """The latest compiled table; the file's mtime is checked at most every `check_seconds`."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_seconds
+            self.reload_if_changed()
+        return self.table
@@ -1,36 +1,65 @@
+from typing import Optional
+
 import pandas as pd
-from fastapi import FastAPI, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, HTTPException, Request
 
 from classify import classify
+from classifier_engine import WARM_UP_ON_STARTUP, warm_up
+from classify_executor import run_blocking, shutdown
+import llm_client
+from result_response import dataframe_response, negotiate_format, serialize_dataframe
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+def warm_up_engine():
+    # Pay for the engine, embedding model and tokenizer before the first request instead of during it
+    if WARM_UP_ON_STARTUP:
+        print("Warm-up seconds:", warm_up())
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    shutdown()
+    # Close pooled LLM connections
+    llm_client.close()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+def classify_file(csv_file, output_format: str) -> bytes:
+    # Runs on the classification pool: pandas I/O, retrieval and LLM calls are all blocking
+    df = pd.read_csv(csv_file, encoding='ISO-8859-1')
+    if "source" not in df.columns or "log_message" not in df.columns:
+        raise HTTPException(status_code=400, detail="CSV must contain 'source' and 'log_message' columns.")
+
+    # Perform classification
+    labels, routing_info = classify(list(zip(df["source"], df["log_message"])))
+    df["target_label"] = labels
+    df["routing_info"] = routing_info
+
+    print("Dataframe:",df.to_dict())
+
+    # Serialize in memory; nothing is shared on disk between requests
+    return serialize_dataframe(df, output_format)
+
+
 @app.post("/classify/")
-async def classify_logs(file: UploadFile):
+async def classify_logs(request: Request, file: UploadFile, output_format: Optional[str] = None):
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV.")
     
     try:
-        # Read the uploaded CSV
-        df = pd.read_csv(file.file, encoding='ISO-8859-1')
-        if "source" not in df.columns or "log_message" not in df.columns:
-            raise HTTPException(status_code=400, detail="CSV must contain 'source' and 'log_message' columns.")
-
-        # Perform classification
-        df["target_label"] = classify(list(zip(df["source"], df["log_message"])))
-
-        print("Dataframe:",df.to_dict())
-
-        # Save the modified file
-        output_file = "output.csv"
-        df.to_csv(output_file, index=False)
-        print("File saved to output.csv")
-        return FileResponse(output_file, media_type='text/csv')
+        output_format = negotiate_format(request, output_format)
+        body = await run_blocking(classify_file, file.file, output_format)
+        return dataframe_response(body, output_format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        file.file.close()
-        # # Clean up if the file was saved
-        # if os.path.exists("output.csv"):
-        #     os.remove("output.csv")
\ No newline at end of file
+        file.file.close()
\ No newline at end of file
@@ -1,60 +1,299 @@
+import json
+import os
+import shutil
+import tempfile
+
 import pandas as pd
 from fastapi import FastAPI, UploadFile, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
 
+from classifier_engine import WARM_UP_ON_STARTUP, get_engine, warm_up
 from classify3 import classify
+from classify_executor import run_blocking, shutdown
+import llm_client
+from team_queues import TEAM_QUEUES_ENABLED, get_team_queues
+from jobs import RESULT_COLUMNS, JobStore, JobWorkerPool
+from result_response import dataframe_response, negotiate_format, serialize_dataframe
 
 app = FastAPI()
 
+# Background job queue for batches too large for a single request; created in the startup
+# hook, so importing this module doesn't create jobs.sqlite
+job_store: Optional[JobStore] = None
+job_workers: Optional[JobWorkerPool] = None
+
+# Rows read, classified and emitted at a time by /classify/stream/
+STREAM_CHUNK_SIZE = int(os.getenv("CLASSIFY_STREAM_CHUNK_SIZE", "200"))
+
+STREAM_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+@app.on_event("startup")
+def start_job_workers():
+    global job_store, job_workers
+    # Warm up first, so the job workers don't race to build the engine
+    if WARM_UP_ON_STARTUP:
+        print("Warm-up seconds:", warm_up())
+    job_store = JobStore()
+    job_workers = JobWorkerPool(job_store, classify)
+    job_workers.start()
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    if job_workers is not None:
+        job_workers.stop()
+    shutdown()
+    # Close pooled LLM connections
+    llm_client.close()
+    # Snapshot the team queues, so waiting tickets survive the restart
+    if TEAM_QUEUES_ENABLED:
+        get_team_queues().save()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    # Hit/miss counters for the persistent classification cache
+    engine = get_engine()
+    if engine.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.cache.stats()}
+
+
+@app.get("/local-classifier/stats")
+async def local_classifier_stats():
+    # Escalation rate, estimated LLM spend saved and agreement with the LLM on escalated tickets
+    engine = get_engine()
+    if engine.local_classifier is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.local_classifier.stats()}
 
-@app.post("/classify/")
-async def classify_logs(request: Request, file: Optional[UploadFile] = None):
-    try:
-        # If a file is uploaded
-        if file:
-            if not file.filename.endswith('.csv'):
-                raise HTTPException(status_code=400, detail="File must be a CSV.")
 
-            df = pd.read_csv(file.file, encoding='ISO-8859-1')
-            if "channel" not in df.columns or "message_content" not in df.columns:
-                raise HTTPException(status_code=400, detail="CSV must contain 'channel' and 'message_content' columns.")
+@app.get("/memory/stats")
+async def memory_stats():
+    # Reuse of prior classifications for near-duplicate tickets
+    engine = get_engine()
+    if engine.memory is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.memory.stats()}
 
-            logs = list(zip(df["channel"], df["message_content"]))
 
-        # If JSON body is provided instead of a file
-        else:
-            body = await request.json()
-            messages: List[str] = body.get("message_content")
-            channel: Optional[str] = body.get("channel", "unknown")  # Optional channel fallback
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    # LLM request queue depth, wait times and 429s under the RPM / TPM budgets
+    engine = get_engine()
+    return engine.scheduler.stats()
 
-            if not messages or not isinstance(messages, list):
-                raise HTTPException(status_code=400,
-                                    detail="Request body must contain 'message_content' as a list of strings.")
 
-            logs = [(channel, msg) for msg in messages]
-            df = pd.DataFrame(logs, columns=["channel", "message_content"])
+@app.get("/queues")
+async def queue_states():
+    # Depth, capacity, overflow and throughput per downstream team
+    if not TEAM_QUEUES_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, "teams": get_team_queues().states()}
 
-        # Classify the logs
-        labels, routing_info, processing_costs, chroma_ids = classify(logs)
 
-        # Append results
-        df["target_label"] = labels
-        df["routing_info"] = routing_info
-        df["processing_cost"] = processing_costs
-        df["chroma_vector_id"] = chroma_ids
+@app.post("/queues/{team}/next")
+async def next_ticket(team: str):
+    # An agent of `team` pulls its most urgent waiting ticket
+    if not TEAM_QUEUES_ENABLED:
+        raise HTTPException(status_code=404, detail="Team queues are disabled (TEAM_QUEUES_ENABLED=0).")
+    ticket = get_team_queues().dequeue(team)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"No tickets waiting for {team}.")
+    return ticket
 
-        # Save to CSV and return file
-        output_file = "output2.csv"
-        df.to_csv(output_file, index=False)
-        return FileResponse(output_file, media_type='text/csv')
 
+async def read_logs(request: Request, file: Optional[UploadFile]):
+    """Parse a CSV upload or a JSON body into (dataframe, [(channel, message_content), ...])."""
+    # If a file is uploaded
+    if file:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="File must be a CSV.")
+
+        df = await run_blocking(pd.read_csv, file.file, encoding='ISO-8859-1')
+        if "channel" not in df.columns or "message_content" not in df.columns:
+            raise HTTPException(status_code=400, detail="CSV must contain 'channel' and 'message_content' columns.")
+
+        logs = list(zip(df["channel"], df["message_content"]))
+
+    # If JSON body is provided instead of a file
+    else:
+        body = await request.json()
+        messages: List[str] = body.get("message_content")
+        channel: Optional[str] = body.get("channel", "unknown")  # Optional channel fallback
+
+        if not messages or not isinstance(messages, list):
+            raise HTTPException(status_code=400,
+                                detail="Request body must contain 'message_content' as a list of strings.")
+
+        logs = [(channel, msg) for msg in messages]
+        df = pd.DataFrame(logs, columns=["channel", "message_content"])
+
+    return df, logs
+
+
+@app.post("/classify/")
+async def classify_logs(request: Request, file: Optional[UploadFile] = None, output_format: Optional[str] = None):
+    try:
+        output_format = negotiate_format(request, output_format)
+        df, logs = await read_logs(request, file)
+
+        # Classify the logs and serialize the result in memory on the classification pool
+        body = await run_blocking(classify_and_serialize, df, logs, output_format)
+        return dataframe_response(body, output_format)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if file:
             file.file.close()
-            # # Clean up if the file was saved
-            # if os.path.exists("output.csv"):
-            #     os.remove("output.csv")
 
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, file: Optional[UploadFile] = None):
+    try:
+        _, logs = await read_logs(request, file)
+    finally:
+        if file:
+            file.file.close()
+
+    job_id = await run_blocking(job_store.create, logs)
+    return {"job_id": job_id, "total_rows": len(logs)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    status = await run_blocking(job_store.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return status
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(request: Request, job_id: str, output_format: Optional[str] = None):
+    output_format = negotiate_format(request, output_format)
+    status = await run_blocking(job_store.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if status["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}; {status['rows_done']}/{status['total_rows']} rows done.")
+
+    rows = await run_blocking(job_store.results, job_id)
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    body = await run_blocking(serialize_dataframe, df, output_format)
+    return dataframe_response(body, output_format, filename=f"job-{job_id}")
+
+
+def classify_and_serialize(df: pd.DataFrame, logs, output_format: str) -> bytes:
+    labels, routing_info, processing_costs, chroma_ids = classify(logs)
+
+    # Append results
+    df["target_label"] = labels
+    df["routing_info"] = routing_info
+    df["processing_cost"] = processing_costs
+    df["chroma_vector_id"] = chroma_ids
+
+    return serialize_dataframe(df, output_format)
+
+
+def classify_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    labels, routing_info, processing_costs, chroma_ids = classify(list(zip(chunk["channel"], chunk["message_content"])))
+    chunk["target_label"] = labels
+    chunk["routing_info"] = routing_info
+    chunk["processing_cost"] = processing_costs
+    chunk["chroma_vector_id"] = chroma_ids
+    return chunk
+
+
+def serialize_chunk(chunk: pd.DataFrame, output_format: str, header: bool) -> str:
+    if output_format == "ndjson":
+        return chunk.to_json(orient="records", lines=True, force_ascii=False)
+    # Header only on the first chunk so the concatenated stream is one CSV
+    return chunk.to_csv(index=False, header=header)
+
+
+def serialize_stream_error(error: Exception, rows_completed: int, output_format: str) -> str:
+    """
+    The last line of a stream that failed part-way, once the 200 status has been sent:
+    an {"error": ...} record for NDJSON, a "# error: ..." line for CSV.
+    """
+    message = f"{type(error).__name__}: {error}"
+    if output_format == "ndjson":
+        return json.dumps({"error": message, "rows_completed": rows_completed}) + "\n"
+    return f"# error: {message} ({rows_completed} rows completed; the output is incomplete)\n"
+
+
+def spool_upload(upload: UploadFile) -> str:
+    """Copy an upload to a temp file this process owns and return its path; the caller deletes it."""
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as spooled:
+        shutil.copyfileobj(upload.file, spooled)
+    return spooled.name
+
+
+def discard_spooled(reader, path: str):
+    if reader is not None:
+        reader.close()
+    os.remove(path)
+
+
+async def stream_classified_rows(first_chunk, reader, output_format: str, spooled_path: str):
+    """Classify chunk by chunk and yield serialized rows, so memory stays bounded by the chunk size."""
+    rows_completed = 0
+    try:
+        chunk, header = first_chunk, True
+        while chunk is not None:
+            # Reading, classifying and serializing are blocking; keep them off the event loop
+            chunk = await run_blocking(classify_chunk, chunk)
+            yield await run_blocking(serialize_chunk, chunk, output_format, header)
+            rows_completed += len(chunk)
+            chunk, header = await run_blocking(next, reader, None), False
+    except Exception as e:
+        # Too late for an error status; mark the output as partial so clients don't take it as complete
+        print(f"❌ Stream failed after {rows_completed} rows: {e}")
+        yield serialize_stream_error(e, rows_completed, output_format)
+    finally:
+        discard_spooled(reader, spooled_path)
+
+
+@app.post("/classify/stream/")
+async def classify_logs_stream(file: UploadFile, output_format: str = "csv", chunk_size: int = STREAM_CHUNK_SIZE):
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="File must be a CSV.")
+    if output_format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="output_format must be 'csv' or 'ndjson'.")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive.")
+
+    # The stream outlives this handler, and FastAPI may close the upload as soon as the handler
+    # returns; read from a copy the stream owns and deletes when it ends
+    spooled_path = await run_blocking(spool_upload, file)
+    reader = None
+    try:
+        reader = pd.read_csv(spooled_path, encoding='ISO-8859-1', chunksize=chunk_size)
+
+        # Validate against the first chunk before the response starts, while an error status can still be sent
+        first_chunk = await run_blocking(next, reader, None)
+        if first_chunk is None:
+            raise HTTPException(status_code=400, detail="CSV is empty.")
+        if "channel" not in first_chunk.columns or "message_content" not in first_chunk.columns:
+            raise HTTPException(status_code=400, detail="CSV must contain 'channel' and 'message_content' columns.")
+    except BaseException:
+        discard_spooled(reader, spooled_path)
+        raise
+
+    return StreamingResponse(
+        stream_classified_rows(first_chunk, reader, output_format, spooled_path),
+        media_type=STREAM_MEDIA_TYPES[output_format],
+    )
@@ -0,0 +1,226 @@
+# team_queues.py
+
+"""
+Load-aware team queues for routed tickets.
+
+Every routed ticket is placed in its team's queue, a heap ordered by urgency, then
+sentiment, then arrival. Every queue has a capacity (TEAM_QUEUE_DEFAULT_CAPACITY unless
+configured) and optionally an overflow team: a ticket routed to a full team goes down the
+overflow chain to the first team with room, and is rejected (not queued, counted per
+team) if every team in the chain is full. Agents pull the next ticket per team, which
+drives the throughput counters.
+
+Queueing is opt-in (TEAM_QUEUES_ENABLED=1), since it only makes sense where agents
+dequeue, i.e. behind server3. State lives in process and is written to a JSON snapshot,
+so queues survive restarts. Capacities come from the "queues" section of the routing
+rules file, e.g.
+
+    "queues": {"Claims Department": {"capacity": 50, "overflow": "Customer Service"}}
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from routing_rules import ROUTING_RULES_PATH, load_config
+
+TEAM_QUEUES_ENABLED = os.getenv("TEAM_QUEUES_ENABLED", "0") == "1"
+# Capacity of teams the "queues" config doesn't mention, so no queue grows without bound
+TEAM_QUEUE_DEFAULT_CAPACITY = int(os.getenv("TEAM_QUEUE_DEFAULT_CAPACITY", "500"))
+TEAM_QUEUES_SNAPSHOT_PATH = os.getenv("TEAM_QUEUES_SNAPSHOT_PATH", "team_queues.json")
+# Snapshots are written at most this often while busy (and always on shutdown)
+TEAM_QUEUES_SNAPSHOT_SECONDS = float(os.getenv("TEAM_QUEUES_SNAPSHOT_SECONDS", "5"))
+# Dequeues within this window count towards the per-minute throughput
+THROUGHPUT_WINDOW_SECONDS = 60
+
+URGENCY_PRIORITY = {"critical": 3, "high": 2, "medium": 1, "low": 0}
+SENTIMENT_PRIORITY = {"angry": 3, "frustrated": 2, "neutral": 1, "satisfied": 0}
+
+
+def ticket_priority(urgency: Optional[str], sentiment: Optional[str]) -> Tuple[int, int]:
+    """Heap sort key: most urgent first, then most upset first (negated for the min-heap)."""
+    return -URGENCY_PRIORITY.get(urgency, 0), -SENTIMENT_PRIORITY.get(sentiment, 0)
+
+
+class TeamQueue:
+    def __init__(self, name: str, capacity: Optional[int] = None, overflow: Optional[str] = None):
+        self.name = name
+        self.capacity = capacity if capacity is not None else TEAM_QUEUE_DEFAULT_CAPACITY
+        self.overflow = overflow
+        self.heap = []
+        self.enqueued = 0
+        self.dequeued = 0
+        self.overflowed_out = 0
+        self.overflowed_in = 0
+        self.rejected = 0
+        self.recent_dequeues = deque()
+
+    def full(self) -> bool:
+        return len(self.heap) >= self.capacity
+
+    def state(self, now: float) -> dict:
+        while self.recent_dequeues and now - self.recent_dequeues[0] > THROUGHPUT_WINDOW_SECONDS:
+            self.recent_dequeues.popleft()
+        oldest = min((entry[3]["enqueued_at"] for entry in self.heap), default=None)
+        return {
+            "depth": len(self.heap),
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "throughput_per_minute": len(self.recent_dequeues) * 60 / THROUGHPUT_WINDOW_SECONDS,
+            "overflowed_in": self.overflowed_in,
+            "overflowed_out": self.overflowed_out,
+            "rejected": self.rejected,
+            "oldest_wait_seconds": time.time() - oldest if oldest is not None else 0.0,
+        }
+
+
+class TeamQueues:
+    def __init__(self, config: Optional[dict] = None, snapshot_path: Optional[str] = TEAM_QUEUES_SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self.queues: Dict[str, TeamQueue] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._next_save = 0.0
+        self._dirty = False
+        for name, settings in (config or {}).items():
+            self.queues[name] = TeamQueue(name, settings.get("capacity"), settings.get("overflow"))
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._restore(snapshot_path)
+
+    def _queue(self, name: str) -> TeamQueue:
+        if name not in self.queues:
+            self.queues[name] = TeamQueue(name)
+        return self.queues[name]
+
+    def _place(self, team: str) -> Optional[str]:
+        """
+        The team a new ticket for `team` lands in, following overflow while teams are full;
+        None if every team in the chain is full.
+        """
+        current = self._queue(team)
+        seen = {team}
+        while current.full():
+            if current.overflow is None or current.overflow in seen:
+                self.queues[team].rejected += 1
+                return None
+            seen.add(current.overflow)
+            current = self._queue(current.overflow)
+        return current.name
+
+    def enqueue_many(self, tickets: List[dict]) -> List[Optional[str]]:
+        """
+        Queue tickets (dicts with ticket_id, assigned_team, urgency, sentiment) and return
+        the team each one was actually queued with (None for tickets rejected as full).
+        """
+        placed = []
+        now = time.time()
+        with self._lock:
+            for ticket in tickets:
+                team = self._place(ticket["assigned_team"])
+                placed.append(team)
+                if team is None:
+                    continue
+                if team != ticket["assigned_team"]:
+                    self.queues[ticket["assigned_team"]].overflowed_out += 1
+                    self.queues[team].overflowed_in += 1
+                entry = {**ticket, "queued_team": team, "enqueued_at": now, "sequence": next(self._sequence)}
+                queue = self.queues[team]
+                heapq.heappush(queue.heap, (*ticket_priority(ticket.get("urgency"), ticket.get("sentiment")), entry["sequence"], entry))
+                queue.enqueued += 1
+            self._dirty = True
+        self._maybe_save()
+        return placed
+
+    def dequeue(self, team: str) -> Optional[dict]:
+        """Pop the highest-priority ticket waiting for `team`, or None if its queue is empty."""
+        with self._lock:
+            queue = self.queues.get(team)
+            if queue is None or not queue.heap:
+                return None
+            entry = heapq.heappop(queue.heap)[3]
+            queue.dequeued += 1
+            queue.recent_dequeues.append(time.time())
+            self._dirty = True
+        self._maybe_save()
+        return entry
+
+    def states(self) -> Dict[str, dict]:
+        now = time.time()
+        with self._lock:
+            return {name: queue.state(now) for name, queue in sorted(self.queues.items())}
+
+    def _maybe_save(self):
+        now = time.monotonic()
+        if self._dirty and now >= self._next_save:
+            self._next_save = now + TEAM_QUEUES_SNAPSHOT_SECONDS
+            self.save()
+
+    def save(self):
+        """Write the queues to the snapshot file (atomically, via a temp file and rename)."""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            snapshot = {
+                name: {
+                    "capacity": queue.capacity,
+                    "overflow": queue.overflow,
+                    "counters": {
+                        "enqueued": queue.enqueued,
+                        "dequeued": queue.dequeued,
+                        "overflowed_in": queue.overflowed_in,
+                        "overflowed_out": queue.overflowed_out,
+                        "rejected": queue.rejected,
+                    },
+                    "tickets": [entry[3] for entry in queue.heap],
+                }
+                for name, queue in self.queues.items()
+            }
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file)
+            os.replace(tmp_path, self.snapshot_path)
+            self._dirty = False
+
+    def _restore(self, path: str):
+        with open(path, encoding="utf-8") as file:
+            snapshot = json.load(file)
+        last_sequence = -1
+        for name, saved in snapshot.items():
+            # Configured capacities win over the snapshot's, so config changes take effect on restart
+            if name not in self.queues:
+                self.queues[name] = TeamQueue(name, saved.get("capacity"), saved.get("overflow"))
+            queue = self.queues[name]
+            for counter, value in saved.get("counters", {}).items():
+                if hasattr(queue, counter):
+                    setattr(queue, counter, value)
+            for ticket in saved.get("tickets", []):
+                priority = ticket_priority(ticket.get("urgency"), ticket.get("sentiment"))
+                queue.heap.append((*priority, ticket["sequence"], ticket))
+                last_sequence = max(last_sequence, ticket["sequence"])
+            heapq.heapify(queue.heap)
+        # Keep arrival order across restarts
+        self._sequence = itertools.count(last_sequence + 1)
+
+
+_team_queues = None
+_team_queues_lock = threading.Lock()
+
+
+def get_team_queues() -> TeamQueues:
+    """Return the process-wide team queues, configured from the routing rules file."""
+    global _team_queues
+    if _team_queues is None:
+        with _team_queues_lock:
+            if _team_queues is None:
+                config = {}
+                if os.path.exists(ROUTING_RULES_PATH):
+                    config = load_config(ROUTING_RULES_PATH).get("queues", {})
+                _team_queues = TeamQueues(config)
+    return _team_queues
@@ -1,4 +1,146 @@
+# text_normalize.py
+
+"""
+Text normalization for cache keys, stored documents and name matching.
+
+A Normalizer builds its translation table and regexes once. The English stopword set is
+resolved once per process, offline, and cached (see get_stopwords); it is never
+downloaded, so air-gapped workers behave like any other. normalize_text1 / normalize_text2
+keep their original behaviour and run on a shared Normalizer; normalize_many normalizes a whole batch, across a process pool when
+it is large enough to pay for one.
+"""
+
+import os
 import re
+import string
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import FrozenSet, Iterable, List, Optional
+
+# Optional stopword list (one word per line) taking precedence over the bundled one
+STOPWORDS_PATH = os.getenv("STOPWORDS_PATH", "")
+# NLTK's English list, vendored
+BUNDLED_STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords_english.txt")
+# Worker processes for normalize_many; 1 keeps it in process
+NORMALIZE_PROCESSES = int(os.getenv("NORMALIZE_PROCESSES", "1"))
+# Smaller batches aren't worth the cost of starting a pool and pickling texts across
+NORMALIZE_PARALLEL_MIN_TEXTS = int(os.getenv("NORMALIZE_PARALLEL_MIN_TEXTS", "20000"))
+NORMALIZE_CHUNK_SIZE = 1000
+
+
+def load_stopwords(path: str = BUNDLED_STOPWORDS_PATH) -> FrozenSet[str]:
+    """Read a stopword list, one word per line."""
+    with open(path, encoding="utf-8") as file:
+        return frozenset(line.strip() for line in file if line.strip())
+
+
+def _installed_nltk_stopwords() -> Optional[FrozenSet[str]]:
+    """NLTK's English stopwords if nltk and its corpus are already installed; never downloads."""
+    try:
+        from nltk.corpus import stopwords
+
+        return frozenset(stopwords.words('english'))
+    except (ImportError, LookupError):
+        return None
+
+
+def _resolve_stopwords() -> FrozenSet[str]:
+    # An explicitly configured list must exist; silently falling back would hide a typo
+    if STOPWORDS_PATH:
+        if not os.path.exists(STOPWORDS_PATH):
+            raise RuntimeError(
+                f"STOPWORDS_PATH is set to {STOPWORDS_PATH}, which does not exist. Point it at a "
+                "file with one word per line, or unset it to use the bundled list."
+            )
+        return load_stopwords(STOPWORDS_PATH)
+    if os.path.exists(BUNDLED_STOPWORDS_PATH):
+        return load_stopwords(BUNDLED_STOPWORDS_PATH)
+    tried = [BUNDLED_STOPWORDS_PATH]
+    stop_words = _installed_nltk_stopwords()
+    if stop_words is not None:
+        return stop_words
+    tried.append("the nltk 'stopwords' corpus")
+    raise RuntimeError(
+        f"No English stopword list found (tried {', '.join(tried)}). Set STOPWORDS_PATH to a "
+        "file with one word per line, or restore stopwords_english.txt next to text_normalize.py."
+    )
+
+
+_stop_words = None
+_stop_words_lock = threading.Lock()
+
+
+def get_stopwords() -> FrozenSet[str]:
+    """
+    The English stopword set, resolved on first call and cached for the process: the
+    STOPWORDS_PATH file if set, else the bundled list, then an already-installed NLTK corpus.
+    Raises RuntimeError if STOPWORDS_PATH is set but missing, or if none is available;
+    call it at startup to fail fast.
+    """
+    global _stop_words
+    if _stop_words is None:
+        with _stop_words_lock:
+            if _stop_words is None:
+                _stop_words = _resolve_stopwords()
+    return _stop_words
+
+
+class Normalizer:
+    def __init__(self, stop_words: Optional[Iterable[str]] = None):
+        self.punctuation_table = str.maketrans('', '', string.punctuation)
+        self.punctuation = re.compile('[%s]+' % re.escape(string.punctuation))
+        self.non_alphanumeric = re.compile(r'[^a-zA-Z0-9\s]')
+        # Resolved on first use, so a Normalizer that never removes stopwords never looks for them
+        self._stop_words = frozenset(stop_words) if stop_words is not None else None
+
+    @property
+    def stop_words(self) -> FrozenSet[str]:
+        if self._stop_words is None:
+            self._stop_words = get_stopwords()
+        return self._stop_words
+
+    def normalize1(self, text: str) -> str:
+        """Lowercase, strip, drop everything but ASCII letters, digits and whitespace, collapse whitespace."""
+        text = self.non_alphanumeric.sub('', text.lower().strip())
+        # Same as re.sub(r'\s+', ' ', text) but several times faster; removed characters can leave
+        # whitespace at either end, which that collapses to one space rather than dropping
+        collapsed = ' '.join(text.split())
+        if not collapsed:
+            return ' ' if text else ''
+        if text[0].isspace():
+            collapsed = ' ' + collapsed
+        if text[-1].isspace():
+            collapsed += ' '
+        return collapsed
+
+    def normalize2(self, text: str, remove_stopwords: bool = False) -> str:
+        """Lowercase, drop punctuation, collapse and strip whitespace, optionally drop stopwords."""
+        text = text.lower()
+        # str.translate has a fast path for ASCII text only; the regex is faster on anything else
+        text = text.translate(self.punctuation_table) if text.isascii() else self.punctuation.sub('', text)
+        # str.split() splits on exactly the characters \s matches, so this equals re.sub(r'\s+', ' ', ...).strip()
+        words = text.split()
+        if remove_stopwords:
+            stop_words = self.stop_words
+            words = [word for word in words if word not in stop_words]
+        return ' '.join(words)
+
+    def normalize_many(self, texts: Iterable[str], remove_stopwords: bool = False, processes: int = NORMALIZE_PROCESSES) -> List[str]:
+        """normalize2 over a batch, in row order; large batches are spread over `processes` workers."""
+        texts = list(texts)
+        normalize = partial(self.normalize2, remove_stopwords=remove_stopwords)
+        if processes <= 1 or len(texts) < NORMALIZE_PARALLEL_MIN_TEXTS:
+            return [normalize(text) for text in texts]
+        if remove_stopwords:
+            # Resolve here, so workers receive the set with the Normalizer instead of each resolving it
+            self.stop_words
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(normalize, texts, chunksize=NORMALIZE_CHUNK_SIZE))
+
+
+_normalizer = Normalizer()
+
 
 def normalize_text1(text: str) -> str:
     """
@@ -11,22 +153,9 @@ def normalize_text1(text: str) -> str:
     Returns:
         str: The normalized text.
     """
-    # Convert to lowercase
-    text = text.lower()
-    # Remove leading and trailing whitespace
-    text = text.strip()
-    # Remove special characters and punctuation
-    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text)
-    return text
+    return _normalizer.normalize1(text)
 
 
-
-import string
-from nltk.corpus import stopwords
-import nltk
-
 def normalize_text2(text, remove_stopwords=False):
     """
     Normalize input text by:
@@ -42,22 +171,12 @@ def normalize_text2(text, remove_stopwords=False):
     Returns:
     - str: The normalized text.
     """
-    # Lowercase
-    text = text.lower()
-
-    # Remove punctuation
-    text = text.translate(str.maketrans('', '', string.punctuation))
+    return _normalizer.normalize2(text, remove_stopwords)
 
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-
-    if remove_stopwords:
-        nltk.download('stopwords', quiet=True)
-        stop_words = set(stopwords.words('english'))
-        words = text.split()
-        text = ' '.join([word for word in words if word not in stop_words])
 
-    return text
+def normalize_many(texts, remove_stopwords=False, processes=NORMALIZE_PROCESSES):
+    """normalize_text2 over a batch of texts (see Normalizer.normalize_many)."""
+    return _normalizer.normalize_many(texts, remove_stopwords, processes)
 
 ticket7 = """
 Hi Team,
@@ -75,4 +194,4 @@ John Doe
 
 # print("normalize_text1",normalize_text1(ticket7))
 #
-# print("normalize_text2",normalize_text2(ticket7, remove_stopwords=True))
\ No newline at end of file
+# print("normalize_text2",normalize_text2(ticket7, remove_stopwords=True))
@@ -6,13 +6,20 @@ It specifies categories, urgency levels, customer sentiments, and other relevant
 This structure ensures data consistency, enables automatic validation, and facilitates easy integration with AI models and other parts of a support ticket system.
 """
 
+import hashlib
 from typing import List
-import tiktoken
 from pydantic import BaseModel, Field
 from enum import Enum
-import instructor
-from groq import Groq
 from dotenv import load_dotenv
+from llm_client import get_instructor_client
+from context_assembler import CONTEXT_CANDIDATES, CONTEXT_SOURCE, CONTEXT_TOKEN_BUDGET, assemble_context
+from token_accounting import (
+    DEFAULT_TOKENIZER_MODEL,
+    count_tokens,
+    count_tokens_batch,
+    calculate_token_cost,
+    system_prompt_tokens,
+)
 
 load_dotenv()
 
@@ -50,23 +57,73 @@ class TicketClassification(BaseModel):
 # -------------------------------
 # Utilities
 # -------------------------------
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
-
-def calculate_token_cost(token_count: int, cost_per_million_tokens: float) -> float:
-    return (token_count * cost_per_million_tokens) / 1_000_000
-
 def build_combined_input(ticket_text: str, interaction_collection='', policy_collection='') -> str:
-    results = interaction_collection.query(query_texts=[ticket_text], n_results=1)
-    interaction_context = " ".join([doc for sublist in results["documents"] for doc in sublist])
-
-    results = policy_collection.query(query_texts=[ticket_text], n_results=1)
-    policy_context = " ".join([doc for sublist in results["documents"] for doc in sublist])
+    return build_combined_inputs([ticket_text], interaction_collection, policy_collection)[0]
 
-    additional_context = f"{interaction_context} {policy_context}".strip()
+def format_combined_input(ticket_text: str, additional_context: str) -> str:
     return f"{ticket_text}\n\nAdditional Context:\n{additional_context}"
 
+def build_combined_inputs(tickets: List[str], interaction_collection='', policy_collection='', embedding_fn=None, customer_names=None) -> List[str]:
+    """
+    Build the combined LLM input for a whole batch of tickets.
+
+    With `embedding_fn` the batch is embedded once and the same vectors are used to query
+    both collections; otherwise each collection embeds `query_texts` itself (still one call per batch).
+    """
+    contexts = retrieve_contexts(tickets, interaction_collection, policy_collection, embedding_fn, customer_names)
+    return [format_combined_input(ticket_text, context) for ticket_text, context in zip(tickets, contexts)]
+
+def retrieve_contexts(tickets: List[str], interaction_collection='', policy_collection='', embedding_fn=None, customer_names=None) -> List[str]:
+    """Return the retrieved interaction + policy context for each ticket, in order."""
+    assembled = retrieve_assembled_contexts(tickets, interaction_collection, policy_collection, embedding_fn, customer_names)
+    return [context["context"] for context in assembled]
+
+def retrieve_assembled_contexts(tickets: List[str], interaction_collection='', policy_collection='', embedding_fn=None, customer_names=None, token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[dict]:
+    """
+    Retrieve and assemble the context for each ticket, in order.
+
+    `customer_names` holds the canonical cust_name per ticket (or None when unknown). Tickets
+    with a known customer only search that customer's documents; the rest search globally.
+    Each distinct customer in the batch costs one query per collection. Interactions are limited
+    to ingested rows (CONTEXT_SOURCE), so tickets classified earlier never become context. The
+    passages found are fitted into `token_budget` by assemble_context, which also reports tokens
+    used per section.
+    """
+    if not tickets:
+        return []
+
+    embeddings = embedding_fn(tickets) if embedding_fn is not None else None
+    customer_names = customer_names or [None] * len(tickets)
+
+    groups = {}
+    for i, cust_name in enumerate(customer_names):
+        groups.setdefault(cust_name, []).append(i)
+
+    contexts = [None] * len(tickets)
+    for cust_name, rows in groups.items():
+        if embeddings is not None:
+            query = {"query_embeddings": [embeddings[i] for i in rows]}
+        else:
+            query = {"query_texts": [tickets[i] for i in rows]}
+        if cust_name is not None:
+            query["where"] = {"cust_name": cust_name}
+
+        source_filter = {"source": CONTEXT_SOURCE}
+        interaction_query = {
+            **query, "where": {"$and": [query["where"], source_filter]} if "where" in query else source_filter,
+        }
+
+        include = ["documents", "distances"]
+        interaction_results = interaction_collection.query(n_results=CONTEXT_CANDIDATES, include=include, **interaction_query)
+        policy_results = policy_collection.query(n_results=CONTEXT_CANDIDATES, include=include, **query)
+
+        for j, i in enumerate(rows):
+            contexts[i] = assemble_context({
+                "interactions": list(zip(interaction_results["documents"][j], interaction_results["distances"][j])),
+                "policies": list(zip(policy_results["documents"][j], policy_results["distances"][j])),
+            }, token_budget)
+    return contexts
+
 # -------------------------------
 # Classification function
 # -------------------------------
@@ -94,33 +151,48 @@ Analyze the following customer support requests and provide the requested inform
 As additional context, you can use the customer interaction history and customer policies.
 """
 
-# Patch instructor to the Groq client
-groq_client = instructor.from_groq(Groq())
+# Changes whenever SYSTEM_PROMPT is edited, so cached classifications from an older prompt are not reused
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+LLM_MODEL = "deepseek-r1-distill-llama-70b"
+
+def get_llm_client():
+    # Instructor-patched shared Groq client, created on first use. SDK retries are off because
+    # llm_scheduler retries both 429s (pausing every request) and transient errors itself
+    return get_instructor_client(max_retries=0)
 
-def classify_ticket_from_input(combined_input: str) -> TicketClassification:
-    response = groq_client.chat.completions.create(
-        model="deepseek-r1-distill-llama-70b",
+def classify_ticket_from_input(combined_input: str, client=None, timeout: float = None) -> TicketClassification:
+    client = client or get_llm_client()
+    # Only forward a timeout when one is set so the client default still applies otherwise
+    request_options = {"timeout": timeout} if timeout is not None else {}
+    response = client.chat.completions.create(
+        model=LLM_MODEL,
         response_model=TicketClassification,
         temperature=0,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": combined_input}
-        ]
+        ],
+        **request_options
     )
     return response
 
 def get_system_prompt() -> str:
     return SYSTEM_PROMPT
 
-def calculate_total_input_cost(combined_input: str, model: str = "gpt-3.5-turbo", cost_per_million_tokens: float = 0.15) -> dict:
-    system_prompt = get_system_prompt()
-    system_prompt_tokens = count_tokens(system_prompt, model)
-    input_tokens = count_tokens(combined_input, model)
-    total_tokens = input_tokens + system_prompt_tokens
-    total_cost = calculate_token_cost(total_tokens, cost_per_million_tokens)
-    return {
-        "system_prompt_tokens": system_prompt_tokens,
-        "input_tokens": input_tokens,
-        "total_tokens": total_tokens,
-        "total_cost": total_cost
-    }
+def calculate_total_input_cost(combined_input: str, model: str = DEFAULT_TOKENIZER_MODEL, cost_per_million_tokens: float = 0.15) -> dict:
+    return calculate_total_input_costs([combined_input], model, cost_per_million_tokens)[0]
+
+def calculate_total_input_costs(combined_inputs: List[str], model: str = DEFAULT_TOKENIZER_MODEL, cost_per_million_tokens: float = 0.15) -> List[dict]:
+    # The system prompt never changes between tickets, so it is tokenized once per prompt version
+    prompt_tokens = system_prompt_tokens(get_system_prompt(), SYSTEM_PROMPT_VERSION, model)
+    stats = []
+    for input_tokens in count_tokens_batch(combined_inputs, model):
+        total_tokens = input_tokens + prompt_tokens
+        stats.append({
+            "system_prompt_tokens": prompt_tokens,
+            "input_tokens": input_tokens,
+            "total_tokens": total_tokens,
+            "total_cost": calculate_token_cost(total_tokens, cost_per_million_tokens)
+        })
+    return stats
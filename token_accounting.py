@@ -0,0 +1,53 @@
+# token_accounting.py
+
+"""
+Token counting and cost helpers.
+
+Encodings are resolved once per model, system prompt token counts are computed once
+per prompt version, and whole batches are tokenized with tiktoken's threaded batch encoder.
+tiktoken itself is only imported when the first encoding is needed.
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import Iterable, List
+
+DEFAULT_TOKENIZER_MODEL = "gpt-3.5-turbo"
+TOKENIZER_THREADS = int(os.getenv("TOKENIZER_THREADS", "8"))
+
+_system_prompt_tokens = {}
+_system_prompt_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_TOKENIZER_MODEL):
+    import tiktoken
+
+    return tiktoken.encoding_for_model(model)
+
+
+def count_tokens(text: str, model: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    return len(get_encoding(model).encode(text))
+
+
+def count_tokens_batch(texts: Iterable[str], model: str = DEFAULT_TOKENIZER_MODEL, num_threads: int = TOKENIZER_THREADS) -> List[int]:
+    texts = list(texts)
+    if not texts:
+        return []
+    return [len(tokens) for tokens in get_encoding(model).encode_batch(texts, num_threads=num_threads)]
+
+
+def system_prompt_tokens(prompt: str, prompt_version: str, model: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    """Token count of a system prompt, computed once per (prompt version, model)."""
+    key = (prompt_version, model)
+    count = _system_prompt_tokens.get(key)
+    if count is None:
+        count = count_tokens(prompt, model)
+        with _system_prompt_lock:
+            _system_prompt_tokens[key] = count
+    return count
+
+
+def calculate_token_cost(token_count: int, cost_per_million_tokens: float) -> float:
+    return (token_count * cost_per_million_tokens) / 1_000_000
@@ -1,9 +1,10 @@
 import chromadb
 from chromadb.config import Settings
+from embedding_cache import get_embedding_function
 
 client = chromadb.PersistentClient(path="my_vectordb")
 
-collection = client.get_or_create_collection(name="customer_policies")
+collection = client.get_or_create_collection(name="customer_policies", embedding_function=get_embedding_function())
 
 # client.delete_collection(name="my_collection")
 ticket_text = """